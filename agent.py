@@ -1,11 +1,17 @@
-from model import ZombieNet, hard_update, soft_update
-from buffer import ReplayBuffer
+from model import ZombieNet, TwinZombieNet, hard_update, soft_update
+from inference import InferencePolicy
+from buffer import ReplayBuffer, BatchPrefetcher
+from frame_stack import FrameStack
+from schedule import TrainSchedule
+from checkpoint import CheckpointWriter, load_checkpoint
+from metrics import MetricsLogger, WandbExporter
+from profiling import NULL_TIMER, PhaseTimer
+import json
 import torch
 import torch.optim as optim
 import torch.nn.functional as F
 import datetime
 import time
-import wandb  # Added import for wandb
 import random
 import os
 from game import ZombieShooter
@@ -17,9 +23,19 @@ import numpy as np
 import csv
 from collections import deque
 
+def make_result_dir(summary_writer_suffix):
+    """Create results/<timestamp>_<suffix> for a new run and return its path."""
+    timestamp = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+    result_dir = f"results/{timestamp}_{summary_writer_suffix}"
+    os.makedirs(result_dir, exist_ok=True)
+    return result_dir
+
+
 class Agent():
 
-    def __init__(self, env : ZombieShooter, dropout, hidden_layer, learning_rate, step_repeat, gamma):
+    def __init__(self, env : ZombieShooter, dropout, hidden_layer, learning_rate, step_repeat, gamma, replay_dir=None,
+                 prioritized_replay=False, prefetch_batches=0, frame_stack=1, schedule=None,
+                 quantized_policy=False, quantized_sync_interval=250):
 
         self.env = env
 
@@ -27,28 +43,52 @@ class Agent():
 
         self.gamma = gamma
 
-        observation, info = self.env.reset()
+        # Works for a single ZombieShooter and for ZombieShooterVecEnv
+        self.num_envs = getattr(env, "num_envs", 1)
+        frame_shape = self.env.observation_space.shape
+
+        # The networks see the last `frame_stack` frames; replay stores single frames
+        self.frame_stack = FrameStack(frame_stack, frame_shape, num_envs=self.num_envs)
+        observation_shape = self.frame_stack.shape
 
         self.device = 'cuda:0' if torch.cuda.is_available() else 'cpu'
 
         print("Model loaded on: ", self.device)
 
-        self.memory = ReplayBuffer(max_size=500000, input_shape=observation.shape, n_actions=env.action_space.n, device=self.device)
+        # replay_dir keeps the buffer in memory-mapped files that survive restarts
+        self.memory = ReplayBuffer(max_size=500000, input_shape=frame_shape, n_actions=env.action_space.n, device=self.device,
+                                   num_streams=self.num_envs, storage_dir=replay_dir, prioritized=prioritized_replay,
+                                   frame_stack=frame_stack)
 
-        self.model_1 = ZombieNet(action_dim=env.action_space.n, hidden_dim=hidden_layer, dropout=dropout, observation_shape=observation.shape).to(self.device)
-        self.model_2 = ZombieNet(action_dim=env.action_space.n, hidden_dim=hidden_layer, dropout=dropout, observation_shape=observation.shape).to(self.device)  
-        
-        self.target_model_1 = ZombieNet(action_dim=env.action_space.n, hidden_dim=hidden_layer, dropout=dropout, observation_shape=observation.shape).to(self.device)  
-        self.target_model_2 = ZombieNet(action_dim=env.action_space.n, hidden_dim=hidden_layer, dropout=dropout, observation_shape=observation.shape).to(self.device)  
+        # Both Q-heads live in one module: one forward evaluates them together
+        self.model = TwinZombieNet(action_dim=env.action_space.n, hidden_dim=hidden_layer, dropout=dropout, observation_shape=observation_shape).to(self.device)
+        self.target_model = TwinZombieNet(action_dim=env.action_space.n, hidden_dim=hidden_layer, dropout=dropout, observation_shape=observation_shape).to(self.device)
 
-        hard_update(self.target_model_1, self.model_1)
-        hard_update(self.target_model_2, self.model_2)
+        hard_update(self.target_model, self.model)
 
-        self.optimizer_1 = optim.Adam(self.model_1.parameters(), lr=learning_rate)
-        self.optimizer_2 = optim.Adam(self.model_2.parameters(), lr=learning_rate)
+        # Acting runs on a compiled CPU copy of both heads, refreshed from the learner.
+        # The int8 one re-quantizes and retraces on every sync (~0.3 s), so it is
+        # refreshed every `quantized_sync_interval` updates instead
+        self.policy = InferencePolicy([ZombieNet(action_dim=env.action_space.n, hidden_dim=hidden_layer,
+                                                 observation_shape=observation_shape) for _ in range(2)],
+                                      observation_shape, quantize=quantized_policy)
+        self.policy.sync(self.model)
+        self.quantized_sync_interval = quantized_sync_interval
+
+        self.optimizer = optim.Adam(self.model.parameters(), lr=learning_rate)
 
         self.learning_rate = learning_rate
 
+        # Gradient steps per env step, warmup and target-update period
+        self.schedule = schedule or TrainSchedule()
+
+        # Batches sampled ahead on a background thread (0 = sample inline)
+        self.prefetch_batches = prefetch_batches
+        self.prefetcher = None
+
+        # Phase timing, only switched on by train(profile=True)
+        self.timer = NULL_TIMER
+
         # Store hyperparameters for logging
         self.dropout = dropout
         self.hidden_layer = hidden_layer
@@ -56,168 +96,442 @@ class Agent():
         print(f"Memory Size: {asizeof.asizeof(self.memory) / (1024 * 1024 * 1024):2f} Gb")
 
     
+    def select_actions(self, states, epsilon):
+        """Epsilon-greedy actions for a batch of states from the compiled acting policy."""
+        actions = self.policy(states)
+
+        explore = np.random.random(len(actions)) < epsilon
+        if explore.any():
+            actions[explore] = np.random.randint(self.env.action_space.n, size=explore.sum())
+
+        return actions
+
+    def sample_batches(self, batch_size, n=1):
+        """`n` minibatches from the prefetch queue, or sampled inline without prefetching."""
+        if not self.prefetch_batches:
+            return [self.memory.sample_buffer(batch_size) for _ in range(n)]
+
+        if self.prefetcher is None:
+            self.prefetcher = BatchPrefetcher(self.memory, batch_size, queue_size=self.prefetch_batches,
+                                              max_draw=max(self.schedule.gradient_steps, 1))
+        return self.prefetcher.get(n)
+
+    def learn(self, batch_size, total_steps, gradient_steps=1):
+        """Take `gradient_steps` gradient steps, updating the targets when the schedule says so."""
+        while gradient_steps > 0:
+            n = min(gradient_steps, max(self.schedule.gradient_steps, 1))
+            with self.timer.phase("sample"):
+                batches = self.sample_batches(batch_size, n)
+            for batch in batches:
+                self._gradient_step(batch, total_steps)
+                if self.schedule.gradient_step():
+                    with self.timer.phase("target_update"):
+                        if self.schedule.tau < 1:
+                            soft_update(self.target_model, self.model, self.schedule.tau)
+                        else:
+                            hard_update(self.target_model, self.model)
+                if self._policy_sync_due():
+                    with self.timer.phase("policy_sync"):
+                        self._sync_policy()
+            gradient_steps -= n
+
+    def _policy_sync_due(self):
+        if self.policy.quantize and not getattr(self.env, "asynchronous", False):
+            return self.schedule.updates % self.quantized_sync_interval == 0
+        return self.schedule.policy_sync_due()
+
+    def _sync_policy(self):
+        # Actor processes act with the published weights; otherwise acting is local
+        if getattr(self.env, "asynchronous", False):
+            self.env.publish(self.model)
+        else:
+            self.policy.sync(self.model)
+
+    def _gradient_step(self, batch, total_steps):
+        self.timer.begin()
+        states, actions, rewards, next_states, dones, indices, weights = batch
+        dones = dones.unsqueeze(1).float()
+        weights = weights.unsqueeze(1)
+
+        q_values = self.model(states)
+        actions = actions.view(1, -1, 1).long().expand(len(q_values), -1, -1)
+        qsa_b = q_values.gather(2, actions)
+
+        # The target path, including the online pass that picks next actions,
+        # needs no autograd graph
+        with torch.no_grad():
+            next_actions = torch.argmax(self.model(next_states), dim=2, keepdim=True)
+            next_q_values = self.target_model(next_states).gather(2, next_actions).min(dim=0).values
+            target_b = rewards.unsqueeze(1) + (1 - dones) * self.gamma * next_q_values
+
+        # Importance-sampling weights are all ones unless replay is prioritized
+        losses = (weights * F.smooth_l1_loss(qsa_b, target_b.expand_as(qsa_b), reduction='none')).mean(dim=(1, 2))
+        self.timer.lap("forward")
+
+        if self.memory.prioritized:
+            td_errors = (qsa_b.detach() - target_b).abs().mean(dim=0)
+            self.memory.update_priorities(indices, td_errors.squeeze(1).cpu().numpy())
+            self.timer.lap("priority_update")
+
+        # Summed on the device; read back every metrics interval, not every step
+        self.metrics.add(("Loss/Model_1", "Loss/Model_2"), losses)
+        self.metrics.step(total_steps)
+
+        # Each head's loss only reaches its own slice of the stacked weights,
+        # so one backward and one Adam step train both as before
+        self.optimizer.zero_grad()
+        losses.sum().backward()
+        self.optimizer.step()
+        self.timer.lap("backward")
+
     def train(self, episodes, max_episode_steps, summary_writer_suffix,
-          batch_size, epsilon, epsilon_decay, min_epsilon):
-
-        # Login to wandb with the provided API key
-        wandb.login(key="af6d254587eda268053f10932986d263cd1ea176")
-
-        # Initialize wandb run
-        wandb.init(
-            project="ZombieShooter_Training",  # You can change the project name if needed
-            name=summary_writer_suffix,
-            config={
-                "episodes": episodes,
-                "max_episode_steps": max_episode_steps,
-                "batch_size": batch_size,
-                "epsilon": epsilon,
-                "epsilon_decay": epsilon_decay,
-                "min_epsilon": min_epsilon,
-                "gamma": self.gamma,
-                "learning_rate": self.learning_rate,
-                "step_repeat": self.step_repeat,
-                "dropout": self.dropout,
-                "hidden_layer": self.hidden_layer,
-            }
-        )
+          batch_size, epsilon, epsilon_decay, min_epsilon, result_dir=None,
+          checkpoint_interval=None, keep_checkpoints=3, resume=None, metrics_interval=100, wandb_project=None,
+          profile=False):
+        """Train for `episodes` episodes in total, checkpointing every `checkpoint_interval` episodes."""
 
         # === Tạo thư mục kết quả ===
-        timestamp = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-        result_dir = f"results/{timestamp}_{summary_writer_suffix}"
-        os.makedirs(result_dir, exist_ok=True)
-
-        total_steps = 0
-        scores = []
-        best_score = -float("inf")
-        best_model_path = None
-        recent_scores = deque(maxlen=10)  # để tính moving average
+        self.result_dir = result_dir or make_result_dir(summary_writer_suffix)
+
+        config = {
+            "episodes": episodes,
+            "max_episode_steps": max_episode_steps,
+            "batch_size": batch_size,
+            "epsilon": epsilon,
+            "epsilon_decay": epsilon_decay,
+            "min_epsilon": min_epsilon,
+            "gamma": self.gamma,
+            "learning_rate": self.learning_rate,
+            "step_repeat": self.step_repeat,
+            "dropout": self.dropout,
+            "hidden_layer": self.hidden_layer,
+            "num_envs": self.num_envs,
+            "prioritized_replay": self.memory.prioritized,
+            "frame_stack": self.frame_stack.k,
+            **self.schedule.config(),
+            "quantized_policy": self.policy.quantize,
+            "quantized_sync_interval": self.quantized_sync_interval,
+        }
+        with open(os.path.join(self.result_dir, "config.json"), "w") as f:
+            json.dump(config, f, indent=2)
+
+        # === Metrics (ghi nền, wandb tùy chọn) ===
+        exporters = [WandbExporter(wandb_project, summary_writer_suffix, config)] if wandb_project else []
+        self.metrics = MetricsLogger(os.path.join(self.result_dir, "metrics.jsonl"), interval=metrics_interval,
+                                     exporters=exporters)
+
+        self.scores = []
+        self.best_score = -float("inf")
+        self.best_model_path = None
+        self.recent_scores = deque(maxlen=10)  # để tính moving average
+
+        # === Checkpoint (ghi nền) ===
+        self.checkpoints = CheckpointWriter(os.path.join(self.result_dir, "checkpoints"), keep=keep_checkpoints)
+        self.checkpoint_interval = checkpoint_interval
+        progress = (0, epsilon, 0)
+        if resume is not None:
+            progress = self.load_training_state(load_checkpoint(resume))
+            print(f"Resumed from {resume} at episode {progress[0]}")
+
+        # === Đo thời gian từng phase (tùy chọn) ===
+        # Env phases are only visible when the env runs in this process
+        if profile:
+            self.timer = PhaseTimer(synchronize=torch.cuda.synchronize if self.device.startswith('cuda') else None)
+            if hasattr(self.env, "timer"):
+                self.env.timer = self.timer
+        self.timing_path = os.path.join(self.result_dir, "phase_timing.csv")
 
         # === Tạo file CSV log ===
-        csv_path = os.path.join(result_dir, "training_log.csv")
-        with open(csv_path, "w", newline="") as f:
-            writer_csv = csv.writer(f)
-            writer_csv.writerow(["Episode", "Score", "Epsilon", "Steps", "Time"])
+        self.csv_path = os.path.join(self.result_dir, "training_log.csv")
+        if not os.path.exists(self.csv_path):  # resumed runs keep appending to their log
+            with open(self.csv_path, "w", newline="") as f:
+                writer_csv = csv.writer(f)
+                writer_csv.writerow(["Episode", "Score", "Epsilon", "Steps", "Time"])
+
+        if getattr(self.env, "asynchronous", False):
+            progress = self._train_apex(episodes, max_episode_steps, batch_size, *progress)
+        elif self.num_envs > 1:
+            progress = self._train_vectorized(episodes, max_episode_steps, batch_size, epsilon_decay, min_epsilon, *progress)
+        else:
+            progress = self._train_single(episodes, max_episode_steps, batch_size, epsilon_decay, min_epsilon, *progress)
+
+        if self.prefetcher is not None:
+            self.prefetcher.close()
+            self.prefetcher = None
 
-        for episode in range(episodes):
+        if self.checkpoint_interval and progress[0] % self.checkpoint_interval:
+            self.checkpoints.save(self.training_state(*progress), progress[0])
+        self.checkpoints.close()
+
+        # === Lưu kết quả ===
+        # Training curve next to the logs (and to the exporters)
+        fig, ax = plt.subplots(figsize=(6, 4))
+        ax.set_title("Training Progress")
+        ax.set_xlabel("Episode")
+        ax.set_ylabel("Score")
+        ax.plot(self.scores, color='orange')
+        plt.savefig(f"{self.result_dir}/training_curve.png")
+        plt.close(fig)
+        self.metrics.log_image("Training Curve", f"{self.result_dir}/training_curve.png")
+
+        self.metrics.close()
+
+        print(f"\nTraining hoàn tất! Best Score = {self.best_score:.2f}")
+        print(f"Model tốt nhất: {self.best_model_path}")
+        print(f"Kết quả được lưu trong: {self.result_dir}")
+
+    def _train_single(self, episodes, max_episode_steps, batch_size, epsilon_decay, min_epsilon,
+                      start_episode, epsilon, total_steps):
+
+        for episode in range(start_episode, episodes):
             done = False
             episode_reward = 0
             state, info = self.env.reset()
+            stacked_state = self.frame_stack.reset(state)[0]
             episode_steps = 0
             episode_start_time = time.time()
 
             while not done and episode_steps < max_episode_steps:
                 # Epsilon-greedy policy
-                if random.random() < epsilon:
-                    action = self.env.action_space.sample()
-                else:
-                    q_values_1 = self.model_1.forward(state.unsqueeze(0).to(self.device))[0]
-                    q_values_2 = self.model_2.forward(state.unsqueeze(0).to(self.device))[0]
-                    q_values = torch.min(q_values_1, q_values_2)
-                    action = torch.argmax(q_values, dim=-1).item()
-
-                next_state, reward, done, _, _ = self.env.step(action=action, repeat=self.step_repeat)
-                self.memory.store_transition(state, action, reward, next_state, done)
+                with self.timer.phase("act"):
+                    if random.random() < epsilon:
+                        action = self.env.action_space.sample()
+                    else:
+                        action = int(self.policy(stacked_state)[0])
+
+                with self.timer.phase("env_step"):
+                    next_state, reward, done, _, _ = self.env.step(action=action, repeat=self.step_repeat)
+                with self.timer.phase("replay_store"):
+                    self.memory.store_transition(state, action, reward, next_state, done,
+                                                 episode_start=episode_steps == 0)
+                self.timer.add_steps(1)
                 state = next_state
+                stacked_state = self.frame_stack.push(next_state)[0]
                 episode_reward += reward
                 episode_steps += 1
                 total_steps += 1
 
                 # === Huấn luyện model ===
-                if self.memory.can_sample(batch_size):
-                    states, actions, rewards, next_states, dones = self.memory.sample_buffer(batch_size)
-                    dones = dones.unsqueeze(1).float()
-
-                    q_values_1 = self.model_1(states)
-                    q_values_2 = self.model_2(states)
-                    actions = actions.unsqueeze(1).long()
-                    qsa_b_1 = q_values_1.gather(1, actions)
-                    qsa_b_2 = q_values_2.gather(1, actions)
-
-                    next_actions_1 = torch.argmax(self.model_1(next_states), dim=1, keepdim=True)
-                    next_actions_2 = torch.argmax(self.model_2(next_states), dim=1, keepdim=True)
-                    next_q_values_1 = self.target_model_1(next_states).gather(1, next_actions_1)
-                    next_q_values_2 = self.target_model_2(next_states).gather(1, next_actions_2)
-                    next_q_values = torch.min(next_q_values_1, next_q_values_2)
-
-                    target_b = rewards.unsqueeze(1) + (1 - dones) * self.gamma * next_q_values
-
-                    loss_1 = F.smooth_l1_loss(qsa_b_1, target_b.detach())
-                    loss_2 = F.smooth_l1_loss(qsa_b_2, target_b.detach())
-
-                    # Log losses to wandb
-                    wandb.log({"Loss/Model_1": loss_1.item(), "Loss/Model_2": loss_2.item()}, step=total_steps)
-
-                    self.optimizer_1.zero_grad()
-                    loss_1.backward()
-                    self.optimizer_1.step()
-
-                    self.optimizer_2.zero_grad()
-                    loss_2.backward()
-                    self.optimizer_2.step()
-
-                    if episode_steps % 4 == 0:
-                        soft_update(self.target_model_1, self.model_1)
-                        soft_update(self.target_model_2, self.model_2)
-
-            # === Kết thúc episode ===
-            scores.append(episode_reward)
-            recent_scores.append(episode_reward)
-            avg_score = np.mean(recent_scores)
-
-            # Log score and epsilon to wandb
-            wandb.log({"Score": episode_reward, "Epsilon": epsilon}, step=episode)
-
-            # === Lưu model tốt nhất ===
-            if episode_reward > best_score:
-                best_score = episode_reward
-                best_model_path = f"{result_dir}/best_model_ep{episode}_score{best_score:.2f}.pt"
-
-                # Tạo thư mục models nếu chưa có
-                os.makedirs("models", exist_ok=True)
-
-                # Lưu cả hai model vào folder models/
-                torch.save(self.model_1.state_dict(), f"models/best_model_1.pt")
-                torch.save(self.model_2.state_dict(), f"models/best_model_2.pt")
-
-                # Lưu bản tổng hợp (cả 2 model + thông tin)
-                torch.save({
-                    'model_1': self.model_1.state_dict(),
-                    'model_2': self.model_2.state_dict(),
-                    'score': best_score,
-                    'episode': episode
-                }, best_model_path)
-
-            # === Ghi log CSV ===
-            episode_time = time.time() - episode_start_time
-            with open(csv_path, "a", newline="") as f:
-                writer_csv = csv.writer(f)
-                writer_csv.writerow([episode, episode_reward, epsilon, episode_steps, f"{episode_time:.2f}"])
+                gradient_steps = self.schedule.step(1)
+                if gradient_steps and self.memory.can_sample(batch_size):
+                    self.learn(batch_size, total_steps, gradient_steps)
 
-            # === In tiến trình ===
-            print(f"Episode {episode:03d}/{episodes-1} | "
-                f"Score: {episode_reward:6.2f} | "
-                f"Avg(10): {avg_score:6.2f} | "
-                f"Eps: {epsilon:5.3f} | "
-                f"Steps: {episode_steps:4d} | "
-                f"Time: {episode_time:5.1f}s")
+            self._finish_episode(episode, episodes, episode_reward, epsilon, episode_steps, time.time() - episode_start_time,
+                                 total_steps)
 
             if epsilon > min_epsilon:
                 epsilon *= epsilon_decay
 
-        # === Lưu kết quả ===
-        # Create and log the training curve plot to wandb
-        fig, ax = plt.subplots(figsize=(6, 4))
-        ax.set_title("Training Progress")
-        ax.set_xlabel("Episode")
-        ax.set_ylabel("Score")
-        ax.plot(scores, color='orange')
-        plt.savefig(f"{result_dir}/training_curve.png")
-        wandb.log({"Training Curve": wandb.Image(fig)})
-        plt.close(fig)
+            self._maybe_checkpoint(episode + 1, epsilon, total_steps)
 
-        # Finish wandb run
-        wandb.finish()
-
-        print(f"\nTraining hoàn tất! Best Score = {best_score:.2f}")
-        print(f"Model tốt nhất: {best_model_path}")
-        print(f"Kết quả được lưu trong: {result_dir}")
\ No newline at end of file
+        return episodes, epsilon, total_steps
+
+    def _train_vectorized(self, episodes, max_episode_steps, batch_size, epsilon_decay, min_epsilon,
+                          episode, epsilon, total_steps):
+
+        # Truncation happens inside the workers so each env can auto-reset on its own
+        self.env.max_episode_steps = max_episode_steps
+
+        states, infos = self.env.reset()
+        stacked_states = self.frame_stack.reset(states)
+        episode_rewards = np.zeros(self.num_envs)
+        episode_steps = np.zeros(self.num_envs, dtype=np.int64)
+        episode_start_times = np.full(self.num_envs, time.time())
+
+        while episode < episodes:
+            with self.timer.phase("act"):
+                actions = self.select_actions(stacked_states, epsilon)
+            with self.timer.phase("env_step"):
+                next_states, rewards, dones, truncateds, infos = self.env.step(actions)
+
+            with self.timer.phase("replay_store"):
+                for i in range(self.num_envs):
+                    # On auto-reset next_states[i] already belongs to the new episode
+                    final_state = infos[i]["final_observation"] if dones[i] or truncateds[i] else next_states[i]
+                    self.memory.store_transition(states[i], actions[i], rewards[i], final_state, dones[i], stream=i,
+                                                 episode_start=episode_steps[i] == 0)
+            self.timer.add_steps(self.num_envs)
+
+            states = next_states
+            stacked_states = self.frame_stack.push(next_states)
+            for i in np.flatnonzero(dones | truncateds):
+                self.frame_stack.reset(next_states[i], index=i)
+            episode_rewards += rewards
+            episode_steps += 1
+            total_steps += self.num_envs
+
+            # === Huấn luyện model ===
+            # The schedule counts transitions from every env
+            gradient_steps = self.schedule.step(self.num_envs)
+            if gradient_steps and self.memory.can_sample(batch_size):
+                self.learn(batch_size, total_steps, gradient_steps)
+
+            for i in np.flatnonzero(dones | truncateds):
+                if episode >= episodes:
+                    break
+
+                self._finish_episode(episode, episodes, float(episode_rewards[i]), epsilon,
+                                     int(episode_steps[i]), time.time() - episode_start_times[i], total_steps)
+                episode += 1
+
+                episode_rewards[i] = 0
+                episode_steps[i] = 0
+                episode_start_times[i] = time.time()
+
+                if epsilon > min_epsilon:
+                    epsilon *= epsilon_decay
+
+                self._maybe_checkpoint(episode, epsilon, total_steps)
+
+        return episode, epsilon, total_steps
+
+    def _train_apex(self, episodes, max_episode_steps, batch_size, episode, epsilon, total_steps):
+
+        # Actors explore with fixed per-actor epsilons, so there is no decay here
+        model_kwargs = dict(action_dim=self.env.action_space.n, hidden_dim=self.hidden_layer,
+                            observation_shape=self.frame_stack.shape)
+        # Actors count publishes, which go out every policy_sync_interval updates
+        quantized_sync_every = max(1, self.quantized_sync_interval // self.schedule.policy_sync_interval)
+        self.env.start(self.model, model_kwargs, self.frame_stack.k, max_episode_steps,
+                       quantize=self.policy.quantize, quantized_sync_every=quantized_sync_every)
+
+
+        while episode < episodes:
+            with self.timer.phase("wait_actors"):
+                stream, transitions, finished = self.env.get()
+            with self.timer.phase("replay_store"):
+                for state, action, reward, next_state, done, episode_start in transitions:
+                    self.memory.store_transition(state, action, reward, next_state, done, stream=stream,
+                                                 episode_start=episode_start)
+            self.timer.add_steps(len(transitions))
+            total_steps += len(transitions)
+
+            # === Huấn luyện model ===
+            gradient_steps = self.schedule.step(len(transitions))
+            if gradient_steps and self.memory.can_sample(batch_size):
+                self.learn(batch_size, total_steps, gradient_steps)
+
+            for episode_reward, episode_steps, episode_time, actor_epsilon in finished:
+                if episode >= episodes:
+                    break
+
+                self._finish_episode(episode, episodes, episode_reward, actor_epsilon, episode_steps, episode_time,
+                                     total_steps)
+                episode += 1
+
+                self._maybe_checkpoint(episode, epsilon, total_steps)
+
+        return episode, epsilon, total_steps
+
+    def training_state(self, episode, epsilon, total_steps):
+        """Everything needed to continue training from the start of episode `episode`."""
+        return {
+            'episode': episode,
+            'epsilon': epsilon,
+            'total_steps': total_steps,
+            'model': self.model.state_dict(),
+            'target_model': self.target_model.state_dict(),
+            'optimizer': self.optimizer.state_dict(),
+            'schedule': {'env_steps': self.schedule.env_steps, 'updates': self.schedule.updates},
+            'scores': list(self.scores),
+            'recent_scores': list(self.recent_scores),
+            'best_score': self.best_score,
+            'best_model_path': self.best_model_path,
+            'replay': {
+                'mem_ctr': self.memory.mem_ctr,
+                'stream_ctr': self.memory.stream_ctr.tolist(),
+                'beta': getattr(self.memory, 'beta', None),
+            },
+            'rng': {
+                'python': random.getstate(),
+                'numpy': np.random.get_state(),
+                'torch': torch.get_rng_state(),
+                'cuda': torch.cuda.get_rng_state_all() if torch.cuda.is_available() else None,
+            },
+        }
+
+    def load_training_state(self, state):
+        """Restore a training_state() checkpoint; returns (episode, epsilon, total_steps)."""
+        self.model.load_state_dict(state['model'])
+        self.target_model.load_state_dict(state['target_model'])
+        self.optimizer.load_state_dict(state['optimizer'])
+        self.policy.sync(self.model)
+
+        self.schedule.env_steps = state['schedule']['env_steps']
+        self.schedule.updates = state['schedule']['updates']
+        self.scores = list(state['scores'])
+        self.recent_scores.extend(state['recent_scores'])
+        self.best_score = state['best_score']
+        self.best_model_path = state['best_model_path']
+
+        # Replay contents come back from replay_dir, not from the checkpoint
+        if self.memory.mem_ctr < state['replay']['mem_ctr']:
+            print(f"Replay buffer holds {self.memory.mem_ctr} transitions, the checkpoint saw "
+                  f"{state['replay']['mem_ctr']}; use a persistent replay_dir to keep them")
+        if self.memory.prioritized and state['replay']['beta'] is not None:
+            self.memory.beta = state['replay']['beta']
+
+        random.setstate(state['rng']['python'])
+        np.random.set_state(state['rng']['numpy'])
+        torch.set_rng_state(state['rng']['torch'])
+        if state['rng']['cuda'] is not None and torch.cuda.is_available():
+            torch.cuda.set_rng_state_all(state['rng']['cuda'])
+
+        return state['episode'], state['epsilon'], state['total_steps']
+
+    def _maybe_checkpoint(self, episode, epsilon, total_steps):
+        if self.checkpoint_interval and episode % self.checkpoint_interval == 0:
+            self.checkpoints.save(self.training_state(episode, epsilon, total_steps), episode)
+
+    def _finish_episode(self, episode, episodes, episode_reward, epsilon, episode_steps, episode_time, total_steps):
+
+        # === Kết thúc episode ===
+        self.scores.append(episode_reward)
+        self.recent_scores.append(episode_reward)
+        avg_score = np.mean(self.recent_scores)
+
+        self.metrics.log({"Episode": episode, "Score": episode_reward, "Epsilon": epsilon}, step=total_steps)
+
+        # === Lưu model tốt nhất ===
+        if episode_reward > self.best_score:
+            self.best_score = episode_reward
+            self.best_model_path = f"{self.result_dir}/best_model_ep{episode}_score{self.best_score:.2f}.pt"
+
+            # Tạo thư mục models nếu chưa có
+            os.makedirs("models", exist_ok=True)
+
+            # Lưu cả hai model vào folder models/
+            # Each head is saved as a plain ZombieNet state_dict
+            model_1 = self.model.member_state_dict(0)
+            model_2 = self.model.member_state_dict(1)
+            self.checkpoints.write(f"models/best_model_1.pt", model_1)
+            self.checkpoints.write(f"models/best_model_2.pt", model_2)
+
+            # Lưu bản tổng hợp (cả 2 model + thông tin)
+            self.checkpoints.write(self.best_model_path, {
+                'model_1': model_1,
+                'model_2': model_2,
+                'score': self.best_score,
+                'episode': episode
+            })
+
+        # === Ghi log CSV ===
+        with open(self.csv_path, "a", newline="") as f:
+            writer_csv = csv.writer(f)
+            writer_csv.writerow([episode, episode_reward, epsilon, episode_steps, f"{episode_time:.2f}"])
+
+        # === Ghi thời gian từng phase ===
+        if self.timer.enabled:
+            self.timer.write_report(self.timing_path, episode)
+
+        # === Lưu replay buffer (memory-mapped only) ===
+        self.memory.metadata.update(episode=episode, epsilon=epsilon)
+        self.memory.flush()
+
+        # === In tiến trình ===
+        print(f"Episode {episode:03d}/{episodes-1} | "
+            f"Score: {episode_reward:6.2f} | "
+            f"Avg(10): {avg_score:6.2f} | "
+            f"Eps: {epsilon:5.3f} | "
+            f"Steps: {episode_steps:4d} | "
+            f"Time: {episode_time:5.1f}s")
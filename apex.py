@@ -0,0 +1,206 @@
+import ctypes
+import multiprocessing as mp
+import queue
+import random
+import time
+import numpy as np
+import gymnasium as gym
+import torch
+from game import OBSERVATION_SHAPE
+
+
+def actor_epsilons(num_actors, base=0.4, alpha=7):
+    """Fixed exploration rate per actor, from `base` down to base ** (1 + alpha) (Ape-X)."""
+    if num_actors == 1:
+        return [base]
+    return [base ** (1 + alpha * i / (num_actors - 1)) for i in range(num_actors)]
+
+
+def _weight_layout(model_kwargs):
+    from model import ZombieNet
+
+    return [(name, tuple(value.shape)) for name, value in ZombieNet(**model_kwargs).state_dict().items()]
+
+
+def _weight_views(shared_weights, layout, num_members):
+    """One ZombieNet state_dict of tensors viewing the shared buffer per member."""
+    flat = torch.frombuffer(shared_weights, dtype=torch.float32)
+    members, offset = [], 0
+    for _ in range(num_members):
+        views = {}
+        for name, shape in layout:
+            size = int(np.prod(shape))
+            views[name] = flat[offset:offset + size].view(shape)
+            offset += size
+        members.append(views)
+    return members
+
+
+def _actor(index, epsilon, env_kwargs, step_repeat, max_episode_steps, frame_stack, model_kwargs,
+           shared_weights, version, transitions, stop, send_every, seed, quantize, quantized_sync_every):
+    """Plays episodes with the latest published weights and ships transitions to the learner."""
+    from game import ZombieShooter
+    from model import ZombieNet
+    from inference import InferencePolicy
+    from frame_stack import FrameStack
+
+    # Actors scale out across processes, not threads
+    torch.set_num_threads(1)
+    random.seed(seed)
+    np.random.seed(seed)
+
+    env = ZombieShooter(**env_kwargs)
+    env.action_space.seed(seed)
+    stack = FrameStack(frame_stack, env.observation_space.shape)
+
+    members = [ZombieNet(**model_kwargs) for _ in range(2)]
+    policy = InferencePolicy(members, model_kwargs["observation_shape"], quantize=quantize)
+    weights = _weight_views(shared_weights, _weight_layout(model_kwargs), len(members))
+    seen = synced = None
+
+    state, _ = env.reset()
+    stacked_state = stack.reset(state)[0]
+    batch, finished = [], []
+    episode_reward, episode_steps, episode_start_time = 0, 0, time.time()
+
+    try:
+        while not stop.is_set():
+            # Pick up weights published since the last step; the int8 policy
+            # re-quantizes on each sync, so it skips all but every
+            # `quantized_sync_every`-th publish
+            if version.value != seen:
+                seen = version.value
+                if synced is None or not quantize or seen - synced >= quantized_sync_every:
+                    with version.get_lock():
+                        synced = seen = version.value
+                        policy.sync(weights)
+
+            if random.random() < epsilon:
+                action = env.action_space.sample()
+            else:
+                action = int(policy(stacked_state)[0])
+
+            next_state, reward, done, _, _ = env.step(action=action, repeat=step_repeat)
+            batch.append((state, action, reward, next_state, done, episode_steps == 0))
+            episode_reward += reward
+            episode_steps += 1
+
+            if done or episode_steps >= max_episode_steps:
+                finished.append((episode_reward, episode_steps, time.time() - episode_start_time, epsilon))
+                state, _ = env.reset()
+                stacked_state = stack.reset(state)[0]
+                episode_reward, episode_steps, episode_start_time = 0, 0, time.time()
+            else:
+                state = next_state
+                stacked_state = stack.push(next_state)[0]
+
+            if len(batch) >= send_every or finished:
+                # The bounded queue holds actors back when the learner falls behind
+                while not stop.is_set():
+                    try:
+                        transitions.put((index, batch, finished), timeout=0.1)
+                        break
+                    except queue.Full:
+                        pass
+                batch, finished = [], []
+    except KeyboardInterrupt:
+        pass
+
+
+class ApexActorPool():
+    """Actor processes feeding one learner (Ape-X style).
+
+    Each actor owns a ZombieShooter, a frame stack and a traced CPU policy,
+    and explores with its own fixed epsilon from actor_epsilons(). Actors
+    send transitions in chunks of `send_every` through a bounded queue; the
+    learner stores actor i's transitions as replay stream i. The learner
+    publishes weights into one shared float32 buffer guarded by a version
+    counter, and actors copy them in when the version changes (with
+    `quantize`, into an int8 policy every `quantized_sync_every` versions).
+
+    Stands in for the env when building an Agent: it exposes num_envs,
+    action_space and observation_space like ZombieShooterVecEnv.
+    """
+
+    asynchronous = True
+
+    def __init__(self, num_actors, env_kwargs, step_repeat=4, epsilons=None, queue_size=64, send_every=16,
+                 start_method="spawn"):
+        self.num_envs = num_actors
+        self.env_kwargs = env_kwargs
+        self.step_repeat = step_repeat
+        self.epsilons = list(epsilons) if epsilons is not None else actor_epsilons(num_actors)
+        self.send_every = send_every
+
+        self.action_space = gym.spaces.Discrete(7)
+        self.observation_space = gym.spaces.Box(low=0, high=255, shape=OBSERVATION_SHAPE, dtype=np.uint8)
+
+        # spawn: forking after torch has started its thread pools can deadlock the children
+        self.ctx = mp.get_context(start_method)
+        self.transitions = self.ctx.Queue(maxsize=queue_size)
+        self.stop = self.ctx.Event()
+        self.version = self.ctx.Value(ctypes.c_int64, 0)
+        self.processes = []
+        self.closed = False
+
+    def start(self, model, model_kwargs, frame_stack, max_episode_steps, seed=0, quantize=False,
+              quantized_sync_every=1):
+        """Publish `model`'s weights and launch the actors."""
+        layout = _weight_layout(model_kwargs)
+        size = model.num_members * sum(int(np.prod(shape)) for _, shape in layout)
+        self.shared_weights = self.ctx.RawArray(ctypes.c_float, size)
+        self.weights = _weight_views(self.shared_weights, layout, model.num_members)
+        self.publish(model)
+
+        for index, epsilon in enumerate(self.epsilons):
+            process = self.ctx.Process(target=_actor,
+                                       args=(index, epsilon, self.env_kwargs, self.step_repeat, max_episode_steps,
+                                             frame_stack, model_kwargs, self.shared_weights, self.version,
+                                             self.transitions, self.stop, self.send_every, seed + index,
+                                             quantize, quantized_sync_every),
+                                       daemon=True)
+            process.start()
+            self.processes.append(process)
+
+    @torch.no_grad()
+    def publish(self, model):
+        """Copy a TwinZombieNet's weights to the actors."""
+        sources = [model.member_parameters(i) for i in range(model.num_members)]
+        with self.version.get_lock():
+            torch._foreach_copy_([view for views in self.weights for view in views.values()],
+                                 [source[name] for views, source in zip(self.weights, sources) for name in views])
+            self.version.value += 1
+
+    def get(self, timeout=None):
+        """Next (actor index, transitions, finished episodes) chunk; blocks until one arrives."""
+        while True:
+            try:
+                return self.transitions.get(timeout=1.0 if timeout is None else timeout)
+            except queue.Empty:
+                if timeout is not None:
+                    raise
+                if not any(process.is_alive() for process in self.processes):
+                    raise RuntimeError("All actor processes have exited")
+
+    def close(self):
+        if self.closed:
+            return
+
+        self.stop.set()
+        # Drain so actors blocked on a full queue can see the stop flag
+        deadline = time.time() + 5
+        while any(process.is_alive() for process in self.processes) and time.time() < deadline:
+            try:
+                self.transitions.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        for process in self.processes:
+            process.join(timeout=1)
+            if process.is_alive():
+                process.terminate()
+
+        self.closed = True
+
+    def __del__(self):
+        if not getattr(self, "closed", True):
+            self.close()
@@ -0,0 +1,108 @@
+import json
+import os
+import numpy as np
+import pygame
+from PIL import Image, ImageSequence
+
+# =============================
+# PROCESS-WIDE SPRITE CACHE
+# =============================
+# Every sprite set is decoded once per process and the same Surface lists are
+# handed to every player, monster, pickup and effect that asks for them.
+# Keys are (asset path, size, scale); callers must treat the surfaces as
+# read-only since they are shared.
+_cache = {}
+
+DIRECTIONS = ('up', 'down', 'left', 'right')
+
+# Precompiled atlas written by build_atlas.py: one flat uint8 array of RGBA
+# pixels (memory-mapped, so every process shares the same pages) plus a
+# JSON index of frame offsets per cache key
+ATLAS_PIXELS = "atlas/sprites.npy"
+ATLAS_INDEX = "atlas/sprites.json"
+_atlas = None
+
+
+def atlas_key(path, size=None, scale=None):
+    """String form of a cache key, as stored in the atlas index."""
+    return json.dumps([path, list(size) if size else None, scale])
+
+
+def _load_atlas():
+    global _atlas
+    if _atlas is None:
+        if os.path.exists(ATLAS_PIXELS) and os.path.exists(ATLAS_INDEX):
+            with open(ATLAS_INDEX) as f:
+                index = json.load(f)
+            _atlas = (np.load(ATLAS_PIXELS, mmap_mode="r"), index)
+        else:
+            _atlas = (None, {})
+    return _atlas
+
+
+def _from_atlas(path, size=None, scale=None):
+    """Frames for a key straight from the mapped atlas, or None if not baked."""
+    pixels, index = _load_atlas()
+    entries = index.get(atlas_key(path, size, scale))
+    if entries is None:
+        return None
+
+    # frombuffer wraps the mapped pages without copying or decoding
+    return [pygame.image.frombuffer(pixels[offset:offset + w * h * 4], (w, h), "RGBA")
+            for offset, w, h in entries]
+
+
+def _decode_gif(path, size=None, scale=None):
+    """Decode all frames of a GIF into pygame Surfaces.
+
+    `size` resizes every frame to a fixed (w, h) with nearest-neighbour
+    (pixel-art characters); `scale` scales relative to the source frame
+    with LANCZOS (the slash effects).
+    """
+    frames = []
+    for frame in ImageSequence.Iterator(Image.open(path)):
+        frame = frame.convert("RGBA")
+        if size:
+            frame = frame.resize(size, resample=Image.Resampling.NEAREST)
+        elif scale:
+            w, h = frame.size
+            frame = frame.resize((int(w * scale), int(h * scale)), Image.Resampling.LANCZOS)
+        frames.append(pygame.image.fromstring(frame.tobytes(), frame.size, frame.mode))
+    return frames
+
+
+def load_gif_frames(path, size=None, scale=None):
+    """Shared list of frames for a GIF at the given size/scale."""
+    size = tuple(size) if size else None
+    key = (path, size, scale)
+    if key not in _cache:
+        frames = _from_atlas(path, size, scale)
+        _cache[key] = frames if frames is not None else _decode_gif(path, size=size, scale=scale)
+    return _cache[key]
+
+
+def load_animation(name, size=None, scale=None):
+    """{direction: frames} for the four gifs/<name>_<direction>.gif files."""
+    return {direction: load_gif_frames(f"gifs/{name}_{direction}.gif", size=size, scale=scale)
+            for direction in DIRECTIONS}
+
+
+def _decode_image(path, size=None):
+    image = pygame.image.load(path)
+    if size:
+        image = pygame.transform.scale(image, size)
+    return image
+
+
+def load_image(path, size=None, alpha=True):
+    """Shared Surface for an image file, scaled to `size` if given.
+
+    Needs a display mode to be set first (convert/convert_alpha).
+    """
+    size = tuple(size) if size else None
+    key = (path, size, None)
+    if key not in _cache:
+        frames = _from_atlas(path, size)
+        image = frames[0] if frames is not None else _decode_image(path, size)
+        _cache[key] = image.convert_alpha() if alpha else image.convert()
+    return _cache[key]
@@ -0,0 +1,13 @@
+class ThreadErrors():
+    """Keeps an exception from a background thread and re-raises it on the caller's next call."""
+
+    def __init__(self):
+        self.error = None
+
+    def capture(self, error):
+        self.error = error
+
+    def raise_pending(self):
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
@@ -1,53 +1,416 @@
+import functools
+import json
+import os
+import queue
+import threading
 import numpy as np
 import torch
 
+# Per-transition scalars packed into one aligned record, so a batch of them is
+# gathered with a single take() and each field is a strided view
+TRANSITION_DTYPE = np.dtype([("reward", np.float32), ("action", np.uint8),
+                             ("done", bool), ("valid", bool), ("history", np.uint8)], align=True)
+
+
+def _locked(method):
+    """Run a ReplayBuffer method under the buffer's lock (see BatchPrefetcher)."""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+class SumTree():
+    """Binary tree over per-slot priorities stored in one flat array.
+
+    Leaves hold the priorities and every inner node the sum of its two
+    children, so the root is the total. Updating a batch of leaves and
+    finding the leaves for a batch of prefix sums both walk one level at a
+    time for the whole batch: O(log n) array operations per call.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.leaf_start = 1 << max(capacity - 1, 1).bit_length()
+        self.depth = self.leaf_start.bit_length() - 1
+        self.tree = np.zeros(2 * self.leaf_start, dtype=np.float64)
+
+    @property
+    def total(self):
+        return self.tree[1]
+
+    def priorities(self, indices):
+        return self.tree[self.leaf_start + np.asarray(indices)]
+
+    def update(self, indices, priorities):
+        nodes = self.leaf_start + np.asarray(indices, dtype=np.int64)
+        self.tree[nodes] = priorities
+
+        # Leaves sharing a parent write the same sum to it twice, which is
+        # cheaper than deduplicating every level
+        for _ in range(self.depth):
+            nodes = nodes // 2
+            self.tree[nodes] = self.tree[2 * nodes] + self.tree[2 * nodes + 1]
+
+    def find(self, values):
+        """Leaf index for each prefix-sum value in [0, total)."""
+        values = np.array(values, dtype=np.float64)
+        nodes = np.ones(len(values), dtype=np.int64)
+        for _ in range(self.depth):
+            left = self.tree[2 * nodes]
+            go_right = values >= left
+            values -= np.where(go_right, left, 0.0)
+            nodes = 2 * nodes + go_right
+        return nodes - self.leaf_start
+
+
 class ReplayBuffer():
+    """Replay memory that stores each frame once per env stream, optionally memory-mapped and prioritized."""
 
-    def __init__(self, max_size, input_shape, n_actions, device='cpu'):
+    def __init__(self, max_size, input_shape, n_actions, device='cpu', num_streams=1, storage_dir=None,
+                 prioritized=False, alpha=0.6, beta=0.4, beta_steps=100000, priority_eps=1e-6, staging_slots=2,
+                 frame_stack=1):
         self.mem_size = max_size
         self.mem_ctr = 0
-        self.state_memory = np.zeros((self.mem_size, *input_shape), dtype=np.uint8)
-        self.next_state_memory = np.zeros((self.mem_size, *input_shape), dtype=np.uint8)
-        self.action_memory = np.zeros(self.mem_size, dtype=np.float32)
-        self.reward_memory = np.zeros(self.mem_size, dtype=np.float32)
-        self.terminal_memory = np.zeros(self.mem_size, dtype=bool)
+        self.num_streams = num_streams
+        self.input_shape = tuple(input_shape)
+        self.frame_stack = frame_stack
+        self.state_shape = (frame_stack * input_shape[0], *input_shape[1:])
+        self.storage_dir = storage_dir
+
+        # Each stream is a ring of rows: transition r has frame r as its state and
+        # frame r + 1, the state of transition r + 1, as its next state, so a store
+        # writes one new frame. One extra row gives the newest transition room
+        # for its next frame
+        self.rows = max_size // num_streams + 1
+        self.stream_ctr = np.zeros(num_streams, dtype=np.int64)
+
+        # Free-form run information saved alongside the counters (episode number, ...)
+        self.metadata = {}
+
+        # With storage_dir the arrays are .npy files memory-mapped from disk, paged
+        # in as they are touched; meta.json keeps the counters and `metadata`, so
+        # reopening the directory with the same shape resumes the buffer
+        resume = False
+        if storage_dir is not None:
+            os.makedirs(storage_dir, exist_ok=True)
+            resume = self._load_meta()
+
+        self.frame_memory = self._allocate("frames", (self.rows, num_streams, *input_shape), np.uint8, resume)
+        self.transition_memory = self._allocate("transitions", (self.rows, num_streams), TRANSITION_DTYPE, resume)
+        self.action_memory = self.transition_memory["action"]
+        self.reward_memory = self.transition_memory["reward"]
+        self.terminal_memory = self.transition_memory["done"]
+        self.valid_memory = self.transition_memory["valid"]
+
+        # Flat (slot, ...) views used for gathering; slot = row * num_streams + stream
+        self.frame_slots = self.frame_memory.reshape(self.rows * num_streams, *input_shape)
+        self.transition_slots = self.transition_memory.reshape(-1)
+
+        # Prioritized draws are in proportion to priority ** alpha, new transitions
+        # getting the highest priority seen; the importance-sampling weights anneal
+        # beta to 1 over `beta_steps` samples. Uniform draws weigh all ones
+        self.prioritized = prioritized
+        if prioritized:
+            self.alpha = alpha
+            self.beta = beta
+            self.beta_increment = (1.0 - beta) / beta_steps
+            self.priority_eps = priority_eps
+            self.max_priority = 1.0
+            self.tree = SumTree(self.rows * num_streams)
+            # Priorities are not persisted; resumed transitions start out equal
+            self.tree.update(np.arange(self.rows * num_streams), self.valid_memory.reshape(-1).astype(np.float64))
 
         self.device = device
+        self.staging_slots = staging_slots
+        self.staging_batch_size = None
+        # Set while a BatchPrefetcher queues batches ahead of the learner
+        self.prefetched = False
+
+        # Stores, priority updates and sampling may come from different threads
+        self.lock = threading.Lock()
+
+    @property
+    def meta_path(self):
+        return os.path.join(self.storage_dir, "meta.json")
+
+    def _load_meta(self):
+        """Restore counters from an earlier run in storage_dir; False if there is none to resume."""
+        if not os.path.exists(self.meta_path):
+            return False
+
+        with open(self.meta_path) as f:
+            meta = json.load(f)
+
+        if (meta["mem_size"], meta["num_streams"], tuple(meta["input_shape"]), meta.get("transition_dtype")) != \
+                (self.mem_size, self.num_streams, self.input_shape, str(TRANSITION_DTYPE.descr)):
+            print(f"Replay buffer in {self.storage_dir} has a different layout, starting a new one")
+            return False
+
+        self.mem_ctr = meta["mem_ctr"]
+        self.stream_ctr = np.array(meta["stream_ctr"], dtype=np.int64)
+        self.metadata = meta["metadata"]
+        print(f"Resumed replay buffer from {self.storage_dir} ({self.mem_ctr} transitions)")
+        return True
+
+    def _allocate(self, name, shape, dtype, resume):
+        if self.storage_dir is None:
+            return np.zeros(shape, dtype=dtype)
+
+        # open_memmap writes a .npy header, so the files also load with np.load
+        path = os.path.join(self.storage_dir, f"{name}.npy")
+        return np.lib.format.open_memmap(path, mode="r+" if resume else "w+", dtype=dtype, shape=shape)
+
+    @_locked
+    def flush(self):
+        """Write mapped pages and counters to disk (no-op for an in-memory buffer)."""
+        if self.storage_dir is None:
+            return
+
+        self.frame_memory.flush()
+        self.transition_memory.flush()
+
+        meta = {
+            "mem_size": self.mem_size,
+            "num_streams": self.num_streams,
+            "input_shape": list(self.input_shape),
+            "transition_dtype": str(TRANSITION_DTYPE.descr),
+            "mem_ctr": self.mem_ctr,
+            "stream_ctr": self.stream_ctr.tolist(),
+            "metadata": self.metadata,
+        }
+        # Replace atomically so a crash mid-write never leaves a truncated meta.json
+        tmp_path = self.meta_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, self.meta_path)
+
 
-    
     def can_sample(self, batch_size):
         if self.mem_ctr > (batch_size * 5):
             return True
         else:
             return False
-        
-    
-    def store_transition(self, state, action, reward, next_state, done):
-        index = self.mem_ctr % self.mem_size
 
-        self.state_memory[index] = state
-        self.next_state_memory[index] = next_state
-        self.action_memory[index] = torch.tensor(action).detach().cpu()
-        self.reward_memory[index] = reward
-        self.terminal_memory[index] = done
 
+    @_locked
+    def store_transition(self, state, action, reward, next_state, done, stream=0, episode_start=False):
+        """Store one transition of `stream`; `episode_start` marks the first one after a reset."""
+        index = self.stream_ctr[stream] % self.rows
+        next_index = (index + 1) % self.rows
+
+        # Rows whose valid flag changes, applied in one priority-tree update
+        rows, valid = [index], [True]
+
+        history = 0
+        if self.stream_ctr[stream] > 0:
+            # Frame `index` holds the previous transition's next state. A new
+            # episode overwrites it, so a previous transition cut off by the time
+            # limit is lost and never sampled; a done one keeps its row, as its
+            # next state is masked out of the target anyway
+            previous = (index - 1) % self.rows
+            if not self.terminal_memory[previous, stream]:
+                if episode_start:
+                    rows.append(previous)
+                    valid.append(False)
+                else:
+                    history = min(int(self.transition_memory["history"][previous, stream]) + 1, 255)
+
+        self.frame_memory[index, stream] = state
+        self.frame_memory[next_index, stream] = next_state
+        self.action_memory[index, stream] = action
+        self.reward_memory[index, stream] = reward
+        self.terminal_memory[index, stream] = done
+        self.transition_memory["history"][index, stream] = history
+
+        # The next row's state frame was just replaced, so the oldest transition
+        # is gone, as are the ones whose stacks reached back to that frame
+        for offset in range(1, self.frame_stack + 1):
+            rows.append((index + offset) % self.rows)
+            valid.append(False)
+        self._set_valid(np.array(rows), stream, np.array(valid))
+
+        self.stream_ctr[stream] += 1
         self.mem_ctr += 1
 
+    def _set_valid(self, rows, stream, valid):
+        self.valid_memory[rows, stream] = valid
+        if self.prioritized:
+            priorities = np.where(valid, self.max_priority ** self.alpha, 0.0)
+            self.tree.update(rows * self.num_streams + stream, priorities)
+
+    def _sample_prioritized(self, batch_size):
+        # One draw per equal slice of the total keeps the batch spread out
+        bounds = np.linspace(0.0, self.tree.total, batch_size + 1)
+        values = np.random.uniform(bounds[:-1], bounds[1:])
+        slots = self.tree.find(values)
+
+        # Rounding at a slice edge can land on an empty leaf; fall back to the last valid pick
+        priorities = self.tree.priorities(slots)
+        empty = priorities <= 0
+        if empty.any():
+            slots[empty] = slots[~empty][-1] if (~empty).any() else slots[empty]
+            priorities = self.tree.priorities(slots)
+
+        count = int(self.valid_memory.sum())
+        weights = (count * priorities / self.tree.total) ** -self.beta
+        weights /= weights.max()
+        self.beta = min(1.0, self.beta + self.beta_increment)
+
+        rows, streams = np.divmod(slots, self.num_streams)
+        return rows, streams, weights
+
+    @_locked
+    def update_priorities(self, indices, td_errors):
+        """Set the priorities of sampled slots from their new TD errors."""
+        indices = np.asarray(indices, dtype=np.int64)
+        priorities = np.abs(np.asarray(td_errors, dtype=np.float64)) + self.priority_eps
+        self.max_priority = max(self.max_priority, float(priorities.max()))
+
+        # Skip slots that were overwritten since they were sampled
+        rows, streams = np.divmod(indices, self.num_streams)
+        valid = self.valid_memory[rows, streams]
+        self.tree.update(indices[valid], priorities[valid] ** self.alpha)
+
+    def _sample_indices(self, batch_size):
+        max_row = min(int(self.stream_ctr.max()), self.rows)
+        rows = np.random.randint(max_row, size=batch_size)
+        streams = np.random.randint(self.num_streams, size=batch_size)
+
+        # Redraw the few picks that land on invalid or unfilled slots
+        invalid = ~self.valid_memory[rows, streams]
+        while invalid.any():
+            count = int(invalid.sum())
+            rows[invalid] = np.random.randint(max_row, size=count)
+            streams[invalid] = np.random.randint(self.num_streams, size=count)
+            invalid = ~self.valid_memory[rows, streams]
+
+        return rows, streams
+
+    def _stack_slots(self, rows, streams, history):
+        """Frame slots of the stacks ending at `rows`, oldest first, shape (batch * k,)."""
+        # Stacks are not stored: `history` counts the earlier frames of the
+        # episode behind each row, and frames from before its start repeat
+        # its first frame
+        offsets = np.arange(self.frame_stack - 1, -1, -1)
+        back = np.minimum(offsets[None, :], history.astype(np.int64)[:, None])
+        stack_rows = (rows[:, None] - back) % self.rows
+        return (stack_rows * self.num_streams + streams[:, None]).reshape(-1)
+
+    def _allocate_staging(self, batch_size, pin):
+        # Batches are gathered as uint8 into a ring of `staging_slots` reused
+        # buffers; on CUDA they are pinned and copied to the device without
+        # blocking, and a slot waits for its last copy before it is rewritten
+        shape = (self.staging_slots, batch_size, *self.state_shape)
+        self.state_staging = torch.empty(shape, dtype=torch.uint8, pin_memory=pin)
+        self.next_state_staging = torch.empty(shape, dtype=torch.uint8, pin_memory=pin)
+        self.transition_staging = np.empty((self.staging_slots, batch_size), dtype=TRANSITION_DTYPE)
+        # Recorded after each slot's non_blocking host-to-device copies
+        self.staging_events = [None] * self.staging_slots
+        self.staging_batch_size = batch_size
+        self.staging_index = 0
+
+    @_locked
     def sample_buffer(self, batch_size):
-        max_mem = min(self.mem_ctr, self.mem_size)
-        batch = np.random.choice(max_mem, batch_size)
+        if self.prioritized:
+            rows, streams, weights = self._sample_prioritized(batch_size)
+        else:
+            rows, streams = self._sample_indices(batch_size)
+            weights = np.ones(batch_size, dtype=np.float32)
+        indices = rows * self.num_streams + streams
+
+        cuda = torch.cuda.is_available() and str(self.device).startswith("cuda")
+        if cuda or not self.prefetched:
+            # On the CPU the batch is the slot itself, which is safe to reuse
+            # while the learner is done with each batch before drawing the next
+            if self.staging_batch_size != batch_size:
+                self._allocate_staging(batch_size, pin=cuda)
+            slot = self.staging_index
+            self.staging_index = (slot + 1) % self.staging_slots
+            if self.staging_events[slot] is not None:
+                self.staging_events[slot].synchronize()
+            transitions = self.transition_staging[slot]
+            states = self.state_staging[slot]
+            next_states = self.next_state_staging[slot]
+        else:
+            # Prefetched CPU batches wait in the queue while later ones are
+            # gathered, so each needs buffers of its own
+            transitions = np.empty(batch_size, dtype=TRANSITION_DTYPE)
+            states = torch.empty((batch_size, *self.state_shape), dtype=torch.uint8)
+            next_states = torch.empty((batch_size, *self.state_shape), dtype=torch.uint8)
+
+        # Gather scalars in one record pass, then the frames of each stack as
+        # uint8 straight into the batch buffers
+        np.take(self.transition_slots, indices, out=transitions)
+        frames = (batch_size * self.frame_stack, *self.input_shape)
+        np.take(self.frame_slots, self._stack_slots(rows, streams, transitions["history"]),
+                axis=0, out=states.numpy().reshape(frames))
+        np.take(self.frame_slots, self._stack_slots((rows + 1) % self.rows, streams, transitions["history"].astype(np.int64) + 1),
+                axis=0, out=next_states.numpy().reshape(frames))
+
+        states = states.to(self.device, non_blocking=cuda)
+        next_states = next_states.to(self.device, non_blocking=cuda)
+        if cuda:
+            self.staging_events[slot] = torch.cuda.Event()
+            self.staging_events[slot].record()
+        actions = torch.from_numpy(transitions["action"]).to(self.device)
+        rewards = torch.from_numpy(transitions["reward"]).to(self.device)
+        dones = torch.from_numpy(transitions["done"]).to(self.device)
+        weights = torch.from_numpy(np.asarray(weights, dtype=np.float32)).to(self.device)
+
+        return states, actions, rewards, next_states, dones, indices, weights
+
+
+class BatchPrefetcher():
+    """Samples minibatches from a ReplayBuffer on a background thread.
+
+    Up to `queue_size` ready batches (already gathered and on the device)
+    wait in a bounded queue, so the learner only pops them, at most
+    `max_draw` at a time.
+    """
+
+    def __init__(self, memory, batch_size, queue_size=4, max_draw=1):
+        self.memory = memory
+        self.batch_size = batch_size
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.max_draw = max_draw
+        with memory.lock:
+            memory.prefetched = True
+
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="BatchPrefetcher", daemon=True)
+        self.thread.start()
 
-        states = self.state_memory[batch]
-        next_states = self.next_state_memory[batch]
-        actions = self.action_memory[batch]
-        rewards = self.reward_memory[batch]
-        dones = self.terminal_memory[batch]
+    def _run(self):
+        try:
+            while not self.stop_event.is_set():
+                batch = self.memory.sample_buffer(self.batch_size)
+                while not self.stop_event.is_set():
+                    try:
+                        self.queue.put(batch, timeout=0.1)
+                        break
+                    except queue.Full:
+                        continue
+        except Exception as e:
+            # Surface sampling errors in the learner instead of dying silently
+            self.queue.put(e)
 
-        states = torch.tensor(states, dtype=torch.float32).to(self.device)
-        next_states = torch.tensor(next_states, dtype=torch.float32).to(self.device)
-        actions = torch.tensor(actions, dtype=torch.float32).to(self.device)
-        rewards = torch.tensor(rewards, dtype=torch.float32).to(self.device)
-        dones = torch.tensor(dones, dtype=torch.bool).to(self.device)
+    def get(self, n=1):
+        """The next `n` batches, as a list."""
+        if n > self.max_draw:
+            raise ValueError(f"BatchPrefetcher was set up for at most {self.max_draw} batches per draw, got {n}")
 
-        return states, actions, rewards, next_states, dones
+        batches = []
+        for _ in range(n):
+            batch = self.queue.get()
+            if isinstance(batch, Exception):
+                raise batch
+            batches.append(batch)
+        return batches
 
+    def close(self):
+        self.stop_event.set()
+        self.thread.join(timeout=5)
+        with self.memory.lock:
+            self.memory.prefetched = False
@@ -0,0 +1,77 @@
+"""Bake every sprite the game uses into one memory-mappable atlas.
+
+Run once after changing anything in gifs/ or images/:
+
+    python build_atlas.py
+
+Writes atlas/sprites.npy (all frames as one flat RGBA uint8 array) and
+atlas/sprites.json (frame offsets and sizes per asset key). At startup
+assets.py maps the .npy read-only, so N worker processes share one copy of
+the pixels in the page cache instead of each decoding every GIF. Keys
+that are missing from the atlas are still decoded on demand.
+"""
+import json
+import os
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import numpy as np
+import pygame
+from assets import ATLAS_PIXELS, ATLAS_INDEX, DIRECTIONS, atlas_key, _decode_gif, _decode_image
+from bullet import MeleeAttack
+from characters import MONSTER_TYPES
+
+# In-game sizes of everything that gets drawn
+PLAYER_SIZE = 70
+CHEST_SIZE = 70
+HEALTH_DROP_SIZE = 60
+FLOOR_TILE_SIZE = 150
+
+
+def manifest():
+    """(path, size, scale) for every GIF animation and image the game loads."""
+    gifs = [(f"gifs/player_{d}.gif", (PLAYER_SIZE, PLAYER_SIZE), None) for d in DIRECTIONS]
+    for name, size in MONSTER_TYPES.items():
+        gifs += [(f"gifs/{name}_{d}.gif", (size, size), None) for d in DIRECTIONS]
+    gifs += [(f"gifs/slash_{d}.gif", None, MeleeAttack.slash_scale) for d in DIRECTIONS]
+
+    images = [("images/appear.png", (size, size)) for size in sorted(set(MONSTER_TYPES.values()))]
+    images += [
+        ("images/blood.png", (HEALTH_DROP_SIZE, HEALTH_DROP_SIZE)),
+        ("images/blue_flower.png", (CHEST_SIZE, CHEST_SIZE)),
+        ("images/blue_flower_opened.png", (CHEST_SIZE, CHEST_SIZE)),
+        ("images/floor.jpg", (FLOOR_TILE_SIZE, FLOOR_TILE_SIZE)),
+    ]
+    return gifs, images
+
+
+def build_atlas():
+    pygame.init()
+    gifs, images = manifest()
+
+    chunks, index, offset = [], {}, 0
+
+    def add(key, surfaces):
+        nonlocal offset
+        entries = []
+        for surface in surfaces:
+            w, h = surface.get_size()
+            chunks.append(np.frombuffer(pygame.image.tostring(surface, "RGBA"), dtype=np.uint8))
+            entries.append([offset, w, h])
+            offset += w * h * 4
+        index[key] = entries
+
+    for path, size, scale in gifs:
+        add(atlas_key(path, size, scale), _decode_gif(path, size=size, scale=scale))
+    for path, size in images:
+        add(atlas_key(path, size), [_decode_image(path, size)])
+
+    os.makedirs(os.path.dirname(ATLAS_PIXELS), exist_ok=True)
+    np.save(ATLAS_PIXELS, np.concatenate(chunks))
+    with open(ATLAS_INDEX, "w") as f:
+        json.dump(index, f)
+
+    print(f"Baked {len(index)} sprite sets ({offset / (1024 * 1024):.1f} MB) into {ATLAS_PIXELS}")
+
+
+if __name__ == "__main__":
+    build_atlas()
@@ -1,39 +1,19 @@
 import pygame, math
-from PIL import Image
 import random
-
-def load_gif_frames(path, scale=1.0):
-    """Load all frames from a GIF file and return list of Pygame surfaces."""
-    frames = []
-    gif = Image.open(path)
-    try:
-        while True:
-            frame = gif.copy().convert("RGBA")
-            w, h = frame.size
-            frame = frame.resize((int(w * scale), int(h * scale)), Image.Resampling.LANCZOS)
-            surf = pygame.image.fromstring(frame.tobytes(), frame.size, frame.mode)
-            frames.append(surf)
-            gif.seek(gif.tell() + 1)
-    except EOFError:
-        pass
-    return frames
-
+from assets import load_gif_frames
 
 class MeleeAttack:
     """Melee attack using directional slash GIF animation with scaled size."""
 
-    slash_gifs = {
-        "up":    load_gif_frames("gifs/slash_up.gif", 0.2),
-        "down":  load_gif_frames("gifs/slash_down.gif", 0.2),
-        "left":  load_gif_frames("gifs/slash_left.gif", 0.2),
-        "right": load_gif_frames("gifs/slash_right.gif", 0.2),
-    }
+    slash_scale = 0.2
 
-    def __init__(self, x, y, direction, delay_ms=80, active_ms=300, reach=90, damage=1):
+    def __init__(self, x, y, direction, delay_ms=80, active_ms=300, reach=90, damage=1, clock=None):
         self.x = x
         self.y = y
         self.direction = direction
-        self.start_time = pygame.time.get_ticks()
+        # Any object with get_ticks(); the env passes its simulation clock
+        self.clock = clock if clock is not None else pygame.time
+        self.start_time = self.clock.get_ticks()
         self.delay_ms = delay_ms
         self.active_ms = active_ms
         self.reach = reach
@@ -43,7 +23,8 @@ class MeleeAttack:
         self.processed = False
         self.end_time = self.start_time + self.delay_ms + self.active_ms
 
-        self.frames = MeleeAttack.slash_gifs[self.direction]
+        # Decoded on first use and shared through the asset cache
+        self.frames = load_gif_frames(f"gifs/slash_{self.direction}.gif", scale=MeleeAttack.slash_scale)
         self.frame_duration = self.active_ms / max(1, len(self.frames))
         self.current_frame = 0
 
@@ -51,7 +32,7 @@ class MeleeAttack:
         self.rect = pygame.Rect(x, y, reach, reach)
 
     def update(self):
-        now = pygame.time.get_ticks()
+        now = self.clock.get_ticks()
 
         if not self.active and now >= self.start_time + self.delay_ms:
             self.active = True
@@ -103,10 +84,11 @@ class BloodBurst:
 
     def __init__(self, x, y, max_radius=200, expand_ms=300,
                  dot_duration_ms=3000, damage=1, dot_damage_per_tick=1,
-                 tick_interval_ms=1000):
+                 tick_interval_ms=1000, clock=None):
         self.x = x
         self.y = y
-        self.start_time = pygame.time.get_ticks()
+        self.clock = clock if clock is not None else pygame.time
+        self.start_time = self.clock.get_ticks()
         self.max_radius = max_radius
         self.expand_ms = expand_ms
         self.dot_duration_ms = dot_duration_ms
@@ -117,7 +99,7 @@ class BloodBurst:
         self.current_radius = 0
         self.active = True
         self.processed = False
-        # store zombies that received the DOT: {zombie: end_time}
+        # store monsters that received the DOT: {monster id: end_time}
         self.dot_targets = {}
 
         # Visual / particle data
@@ -167,7 +149,7 @@ class BloodBurst:
             })
 
     def update(self):
-        now = pygame.time.get_ticks()
+        now = self.clock.get_ticks()
         elapsed = now - self.start_time
 
         # expand radius smoothly
@@ -241,7 +223,7 @@ class BloodBurst:
         screen.blit(ring_surf, (self.x - pulse_radius - 2 - camera_x, self.y - pulse_radius - 2 - camera_y))
 
         # Inner core flash at growth moment (brighter when still expanding)
-        now = pygame.time.get_ticks()
+        now = self.clock.get_ticks()
         elapsed = now - self.start_time
         if elapsed < self.expand_ms:
             core_alpha = int(220 * (1 - elapsed / self.expand_ms))
@@ -1,26 +1,10 @@
 import random
 import pygame
 import math
-from PIL import Image, ImageSequence
-from util import *
-
-# =============================
-# HÀM HỖ TRỢ LOAD GIF
-# =============================
-def load_gif_frames(path, size):
-    """Trả về danh sách các frame pygame.Surface từ 1 file GIF"""
-    pil_gif = Image.open(path)
-    frames = []
-    for frame in ImageSequence.Iterator(pil_gif):
-        frame = frame.convert("RGBA")
-        # Use nearest-neighbor resizing to preserve pixel-art clarity and match backend pixel size
-        frame = frame.resize(size, resample=Image.Resampling.NEAREST)
-        mode = frame.mode
-        data = frame.tobytes()
-        pygame_img = pygame.image.fromstring(data, frame.size, mode)
-        frames.append(pygame_img)
-    return frames
-
+import numpy as np
+from spatial import SpatialGrid, level_cache, wall_occupancy
+from pathfinding import FlowField
+from assets import load_animation, load_image, DIRECTIONS
 
 # =============================
 # PLAYER CLASS
@@ -35,9 +19,10 @@ class Player:
         self.y = world_height // 2
 
         # Spawn tại vị trí hợp lệ
+        occupancy = wall_occupancy(walls)
         while True:
             self.rect = pygame.Rect(self.x, self.y, self.size, self.size)
-            if check_collision(self.rect, walls):
+            if occupancy.any_rect(self.rect):
                 self.x += random.randint(-5, 5)
                 self.y += random.randint(-5, 5)
             else:
@@ -47,11 +32,8 @@ class Player:
         self.ammo = 10
         self.health = 5
 
-        # Load animation từ GIFs
-        self.animations = {}
-        for direction in ('up', 'down', 'left', 'right'):
-            frames = load_gif_frames(f'gifs/player_{direction}.gif', (self.size, self.size))
-            self.animations[direction] = frames
+        # Animation từ GIFs (decoded once per process, shared across resets)
+        self.animations = load_animation('player', size=(self.size, self.size))
 
         self.direction = "down"
         self.frame_index = 0
@@ -71,129 +53,269 @@ class Player:
 
 
 # =============================
-# ZOMBIE / MONSTER CLASS
+# MONSTER STORE (STRUCT OF ARRAYS)
 # =============================
-class Zombie:
-    MONSTER_TYPES = {
-        "bat": 100,
-        "ghost": 120,
-        "monster": 120,
-        "demon": 120
+MONSTER_TYPES = {
+    "bat": 100,
+    "ghost": 120,
+    "monster": 120,
+    "demon": 120
+}
+
+# Góc lệch thử lần lượt khi hướng thẳng tới người chơi bị tường chắn
+PROBE_ANGLES = [0, 15, -15, 30, -30, 45, -45, 60, -60, 90, -90]
+PROBE_COS = np.array([math.cos(math.radians(angle)) for angle in PROBE_ANGLES])
+PROBE_SIN = np.array([math.sin(math.radians(angle)) for angle in PROBE_ANGLES])
+
+
+class MonsterStore:
+    """All monsters of the current level, stored as parallel NumPy arrays.
+
+    Positions, speeds, hp, type and facing live in one row per monster so
+    steering, wall probes and contact checks run as array operations.
+    Monsters removed mid-tick are only flagged dead (kill) and dropped in
+    compact(), so row indices stay valid while effects are processed.
+    Hit tests go through a SpatialGrid over the monster boxes, rebuilt
+    lazily whenever rows move. Steering follows a shared FlowField per
+    monster size. Sprites are looked up by type/direction only when drawing.
+    """
+
+    TYPE_NAMES = list(MONSTER_TYPES.keys())
+    TYPE_SIZES = np.array(list(MONSTER_TYPES.values()))
+
+    FIELDS = {
+        "id": np.int64, "x": np.float64, "y": np.float64, "speed": np.float64,
+        "size": np.int64, "type": np.int8, "direction": np.int8,
+        "hp": np.int64, "max_hp": np.int64, "appear_timer": np.int64,
+        "frame_index": np.int64, "frame_timer": np.int64, "frame_delay": np.int64,
+        "alive": bool,
     }
 
-    def __init__(self, world_width, world_height, speed=1):
+    def __init__(self, world_width, world_height, capacity=32):
         self.world_width = world_width
         self.world_height = world_height
-        self.appearing = True
-        self.appear_timer = 30  # Number of frames to show appearance effect
-        self.speed = speed
+        self.count = 0
+        self.next_id = 0
+        self.capacity = 0
+        self.grid = SpatialGrid()
+        self.grid_dirty = True
+        self._grow(capacity)
+
+    def _grow(self, capacity):
+        for name, dtype in MonsterStore.FIELDS.items():
+            array = np.zeros(capacity, dtype=dtype)
+            if self.capacity:
+                array[:self.count] = getattr(self, name)[:self.count]
+            setattr(self, name, array)
+        self.capacity = capacity
+
+    def __len__(self):
+        return self.count
+
+    def clear(self):
+        self.count = 0
+        self.grid_dirty = True
+
+    def spawn(self, speed=1):
+        if self.count == self.capacity:
+            self._grow(self.capacity * 2)
 
         # --- Random loại quái và đặt kích thước ---
-        self.type = random.choice(list(Zombie.MONSTER_TYPES.keys()))
-        self.size = Zombie.MONSTER_TYPES[self.type]
+        type_index = MonsterStore.TYPE_NAMES.index(random.choice(MonsterStore.TYPE_NAMES))
+        size = int(MonsterStore.TYPE_SIZES[type_index])
 
-        # --- Load hiệu ứng xuất hiện (appear effect) ---
-        self.appear_image = pygame.image.load("images/appear.png").convert_alpha()
-        self.appear_image = pygame.transform.scale(self.appear_image, (self.size, self.size))
+        # --- Spawn vị trí (một trong bốn cạnh bản đồ) ---
+        spawn_positions = [
+            (random.randint(0, self.world_width - size), 0),
+            (random.randint(0, self.world_width - size), self.world_height - size),
+            (0, random.randint(0, self.world_height - size)),
+            (self.world_width - size, random.randint(0, self.world_height - size))
+        ]
+        x, y = random.choice(spawn_positions)
 
-        # --- Health dựa trên kích thước ---
-        self.max_hp = 3 + (self.size - 70) // 10
-        self.hp = self.max_hp
+        i = self.count
+        self.id[i] = self.next_id
+        self.x[i], self.y[i] = x, y
+        self.speed[i] = speed
+        self.size[i] = size
+        self.type[i] = type_index
+        self.direction[i] = DIRECTIONS.index("down")
+        # Health dựa trên kích thước (thanh máu), nhưng mỗi con chỉ có 1 hp thực tế
+        self.max_hp[i] = 3 + (size - 70) // 10
+        self.hp[i] = 1
+        self.appear_timer[i] = 30  # Number of frames to show appearance effect
+        self.frame_index[i] = 0
+        self.frame_timer[i] = 0
+        self.frame_delay[i] = random.randint(10, 20)
+        self.alive[i] = True
 
-        # --- Spawn vị trí ---
-        self.x, self.y = self.spawn()
+        self.count += 1
+        self.next_id += 1
+        self.grid_dirty = True
+        return int(self.id[i])
 
-        # --- Load animation từ GIFs ---
-        self.animations = {}
-        for direction in ('up', 'down', 'left', 'right'):
-            frames = load_gif_frames(f'gifs/{self.type}_{direction}.gif', (self.size, self.size))
-            self.animations[direction] = frames
+    def rect(self, i):
+        return pygame.Rect(self.x[i], self.y[i], self.size[i], self.size[i])
 
-        self.direction = "down"
-        self.frame_index = 0
-        self.frame_timer = 0
-        self.frame_delay = random.randint(10, 20)
+    def index_of(self, monster_id):
+        """Row of a live monster, or -1 if it is gone."""
+        rows = np.flatnonzero((self.id[:self.count] == monster_id) & self.alive[:self.count])
+        return int(rows[0]) if len(rows) else -1
 
-        self.rect = pygame.Rect(0, 0, self.size, self.size)
-        self.rect.center = (self.x, self.y)
-        # Health points for damage handling
-        self.hp = 1
+    def kill(self, rows):
+        self.alive[:self.count][rows] = False
 
-    def spawn(self):
-        spawn_positions = [
-            (random.randint(0, self.world_width - self.size), 0),
-            (random.randint(0, self.world_width - self.size), self.world_height - self.size),
-            (0, random.randint(0, self.world_height - self.size)),
-            (self.world_width - self.size, random.randint(0, self.world_height - self.size))
-        ]
-        return random.choice(spawn_positions)
+    def compact(self):
+        n = self.count
+        keep = self.alive[:n]
+        if keep.all():
+            return
+        kept = int(keep.sum())
+        for name in MonsterStore.FIELDS:
+            array = getattr(self, name)
+            array[:kept] = array[:n][keep]
+        self.count = kept
+        self.grid_dirty = True
 
-    def move_toward_player(self, player_x, player_y, walls):
-        dx, dy = player_x - self.x, player_y - self.y
-        distance = math.hypot(dx, dy)
-        if distance == 0:
+    def monster_grid(self):
+        if self.grid_dirty:
+            n = self.count
+            self.grid.build(np.stack([np.trunc(self.x[:n]), np.trunc(self.y[:n]), self.size[:n], self.size[:n]], axis=1))
+            self.grid_dirty = False
+        return self.grid
+
+    def colliding(self, rect):
+        """Mask of live monsters whose rect overlaps `rect` (Rect.colliderect semantics)."""
+        mask = np.zeros(self.count, dtype=bool)
+        mask[self.monster_grid().query_rect(rect.x, rect.y, rect.width, rect.height)] = True
+        return mask & self.alive[:self.count]
+
+    def near_circle(self, cx, cy, radius):
+        """Rows of live monsters whose box intersects the circle."""
+        rows = self.monster_grid().query_circle(cx, cy, radius)
+        return [i for i in rows if self.alive[i]]
+
+    def update(self):
+        n = self.count
+        appearing = self.appear_timer[:n] > 0
+        self.appear_timer[:n][appearing] -= 1
+
+        # Cập nhật frame animation (index wraps at draw time)
+        animating = ~appearing
+        self.frame_timer[:n][animating] += 1
+        advance = animating & (self.frame_timer[:n] >= self.frame_delay[:n])
+        self.frame_timer[:n][advance] = 0
+        self.frame_index[:n][advance] += 1
+
+    def flow_field(self, walls, size):
+        """Flow field for monsters of `size` on this level, shared by every store and episode."""
+        key = ("flow_field", self.world_width, self.world_height, int(size))
+        return level_cache(walls, key, lambda: FlowField(walls, self.world_width, self.world_height, int(size)))
+
+    def move_toward_player(self, player_x, player_y, walls, player_size=70):
+        n = self.count
+        if n == 0:
             return
 
+        x, y = self.x[:n], self.y[:n]
+        dx, dy = player_x - x, player_y - y
+        distance = np.hypot(dx, dy)
+        moving = distance > 0
+        distance[~moving] = 1
+
         # Hướng gốc
         dir_x, dir_y = dx / distance, dy / distance
+        speed = self.speed[:n]
+        size = self.size[:n]
+        occupancy = wall_occupancy(walls)
 
-        # Kiểm tra va chạm trên hướng chính
-        step_size = self.speed
-        new_rect = pygame.Rect(self.x + dir_x * step_size, self.y + dir_y * step_size, self.size, self.size)
-        if not check_collision(new_rect, walls):
-            self.x += dir_x * step_size
-            self.y += dir_y * step_size
-        else:
-            # Nếu bị chắn → thử các góc lệch
-            found = False
-            for angle in [15, -15, 30, -30, 45, -45, 60, -60, 90, -90]:
-                rad = math.radians(angle)
-                new_dx = dir_x * math.cos(rad) - dir_y * math.sin(rad)
-                new_dy = dir_x * math.sin(rad) + dir_y * math.cos(rad)
-                new_rect = pygame.Rect(self.x + new_dx * step_size, self.y + new_dy * step_size, self.size, self.size)
-                if not check_collision(new_rect, walls):
-                    self.x += new_dx * step_size
-                    self.y += new_dy * step_size
-                    found = True
-                    break
-            if not found:
-                # Nếu không tìm được hướng nào (bị kẹt hoàn toàn) → lùi lại nhẹ
-                back_x = -dir_x * step_size * 0.5
-                back_y = -dir_y * step_size * 0.5
-                new_rect = pygame.Rect(self.x + back_x, self.y + back_y, self.size, self.size)
-                if not check_collision(new_rect, walls):
-                    self.x += back_x
-                    self.y += back_y
-
-        # Cập nhật hướng hiển thị animation
-        if abs(dx) > abs(dy):
-            self.direction = 'right' if dx > 0 else 'left'
-        else:
-            self.direction = 'down' if dy > 0 else 'up'
-
-        self.rect.topleft = (self.x, self.y)
+        # Đi theo flow field: one shared shortest-path field per monster size
+        head_x, head_y = dir_x.copy(), dir_y.copy()
+        step = speed.copy()
+        follow = np.zeros(n, dtype=bool)
+        for monster_size in np.unique(size):
+            rows = np.flatnonzero(size == monster_size)
+            field = self.flow_field(walls, monster_size)
+            field.update(player_x, player_y, player_size)
 
+            target_x, target_y, valid = field.waypoints(x[rows], y[rows])
+            way_x, way_y = target_x - x[rows], target_y - y[rows]
+            way = np.hypot(way_x, way_y)
+            valid &= way > 0
+            rows, way_x, way_y, way = rows[valid], way_x[valid], way_y[valid], way[valid]
 
-    def update(self):
-        if self.appearing:
-            self.appear_timer -= 1
-            if self.appear_timer <= 0:
-                self.appearing = False
-        else:
-            # Cập nhật frame animation
-            self.frame_timer += 1
-            if self.frame_timer >= self.frame_delay:
-                self.frame_timer = 0
-                self.frame_index = (self.frame_index + 1) % len(self.animations[self.direction])
+            head_x[rows], head_y[rows] = way_x / way, way_y / way
+            step[rows] = np.minimum(speed[rows], way)
+            follow[rows] = True
+
+        follow &= moving & ~occupancy.blocked_many(x + head_x * step, y + head_y * step, size, size)
+        x[follow] += head_x[follow] * step[follow]
+        y[follow] += head_y[follow] * step[follow]
+
+        # Greedy probes only where the field has no usable step (already at
+        # the player, no route, or the waypoint is clipped by a wall corner)
+        greedy = np.flatnonzero(moving & ~follow)
+        if len(greedy):
+            step_size = speed[greedy, None]
+            greedy_x, greedy_y = dir_x[greedy, None], dir_y[greedy, None]
+
+            # Hướng chính + các góc lệch, rồi lùi lại nhẹ nếu bị kẹt hoàn toàn
+            cos, sin = PROBE_COS, PROBE_SIN
+            probe_x = (greedy_x * cos - greedy_y * sin) * step_size
+            probe_y = (greedy_x * sin + greedy_y * cos) * step_size
+            probe_x = np.concatenate([probe_x, -greedy_x * step_size * 0.5], axis=1)
+            probe_y = np.concatenate([probe_y, -greedy_y * step_size * 0.5], axis=1)
+
+            probe_size = size[greedy, None]
+            blocked = occupancy.blocked_many(x[greedy, None] + probe_x, y[greedy, None] + probe_y, probe_size, probe_size)
+
+            # First free probe in order wins; no free probe means stay put
+            free = ~blocked
+            choice = free.argmax(axis=1)
+            rows = np.arange(len(greedy))
+            move = free[rows, choice]
+            x[greedy[move]] += probe_x[rows, choice][move]
+            y[greedy[move]] += probe_y[rows, choice][move]
+
+        # Cập nhật hướng hiển thị animation (along the path when following it)
+        face_x = np.where(follow, head_x, dx)
+        face_y = np.where(follow, head_y, dy)
+        horizontal = np.abs(face_x) > np.abs(face_y)
+        facing = np.where(horizontal,
+                          np.where(face_x > 0, DIRECTIONS.index('right'), DIRECTIONS.index('left')),
+                          np.where(face_y > 0, DIRECTIONS.index('down'), DIRECTIONS.index('up')))
+        self.direction[:n][moving] = facing[moving]
+        self.grid_dirty = True
+
+    @classmethod
+    def sprites(cls, type_index):
+        size = int(cls.TYPE_SIZES[type_index])
+        return load_animation(cls.TYPE_NAMES[type_index], size=(size, size))
+
+    @staticmethod
+    def appear_image(size):
+        return load_image("images/appear.png", size=(size, size))
 
     def draw(self, screen, camera_x, camera_y):
-        screen_x = self.x - camera_x
-        screen_y = self.y - camera_y
-        
-        if self.appearing:
-            # Draw the appear effect
-            screen.blit(self.appear_image, (screen_x, screen_y))
-        else:
-            # Draw the normal monster animation
-            current_frame = self.animations[self.direction][self.frame_index]
-            screen.blit(current_frame, (screen_x, screen_y))
\ No newline at end of file
+        for i in range(self.count):
+            if not self.alive[i]:
+                continue
+
+            screen_x = self.x[i] - camera_x
+            screen_y = self.y[i] - camera_y
+            size = int(self.size[i])
+
+            if self.appear_timer[i] > 0:
+                # Draw the appear effect
+                screen.blit(MonsterStore.appear_image(size), (screen_x, screen_y))
+            else:
+                # Draw the normal monster animation
+                frames = MonsterStore.sprites(self.type[i])[DIRECTIONS[self.direction[i]]]
+                screen.blit(frames[self.frame_index[i] % len(frames)], (screen_x, screen_y))
+
+            # draw health bar
+            bar_width = 40
+            hp_ratio = max(0, self.hp[i] / self.max_hp[i])
+            bar_x, bar_y = int(self.x[i]) - camera_x, int(self.y[i]) - camera_y - 5
+            pygame.draw.rect(screen, (255, 0, 0), (bar_x, bar_y, bar_width, 3))
+            pygame.draw.rect(screen, (0, 255, 0), (bar_x, bar_y, int(bar_width * hp_ratio), 3))
@@ -0,0 +1,83 @@
+import glob
+import os
+import queue
+import threading
+import numpy as np
+import torch
+from background import ThreadErrors
+
+
+def to_cpu(obj):
+    """Copy of `obj` with every tensor cloned to the CPU, safe to write while training goes on."""
+    if isinstance(obj, torch.Tensor):
+        return obj.detach().to("cpu", copy=True)
+    if isinstance(obj, np.ndarray):
+        return obj.copy()
+    if isinstance(obj, dict):
+        return type(obj)((key, to_cpu(value)) for key, value in obj.items())
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(to_cpu(value) for value in obj)
+    return obj
+
+
+def latest_checkpoint(directory):
+    """Path of the newest checkpoint_*.pt in `directory`, or None."""
+    paths = sorted(glob.glob(os.path.join(directory, "checkpoint_*.pt")))
+    return paths[-1] if paths else None
+
+
+def load_checkpoint(path):
+    return torch.load(path, map_location="cpu", weights_only=False)
+
+
+class CheckpointWriter():
+    """Writes CPU snapshots to disk atomically on a background thread, keeping the newest `keep` checkpoints."""
+
+    def __init__(self, directory, keep=3, queue_size=2):
+        self.directory = directory
+        self.keep = keep
+        os.makedirs(directory, exist_ok=True)
+
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.errors = ThreadErrors()
+        self.thread = threading.Thread(target=self._run, name="CheckpointWriter", daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            try:
+                if item is None:
+                    return
+                path, state, retain = item
+                tmp_path = path + ".tmp"
+                torch.save(state, tmp_path)
+                os.replace(tmp_path, path)
+                if retain:
+                    self._prune()
+            except Exception as e:
+                self.errors.capture(e)
+            finally:
+                self.queue.task_done()
+
+    def _prune(self):
+        paths = sorted(glob.glob(os.path.join(self.directory, "checkpoint_*.pt")))
+        for path in paths[:max(len(paths) - self.keep, 0)]:
+            os.remove(path)
+
+    def write(self, path, state):
+        """Atomically write `state` to `path` in the background (not subject to retention)."""
+        self.errors.raise_pending()
+        self.queue.put((path, to_cpu(state), False))
+
+    def save(self, state, step):
+        """Write `state` as checkpoint_<step>.pt in the checkpoint directory."""
+        self.errors.raise_pending()
+        path = os.path.join(self.directory, f"checkpoint_{step:08d}.pt")
+        self.queue.put((path, to_cpu(state), True))
+
+    def close(self):
+        """Wait for pending writes and stop the thread."""
+        self.queue.put(None)
+        self.thread.join()
+        self.errors.raise_pending()
@@ -0,0 +1,37 @@
+import numpy as np
+
+
+class FrameStack():
+    """Rolling window of the last `k` observation frames for each env.
+
+    Frames of shape (C, H, W) are stacked along the channel axis into
+    (k * C, H, W) uint8 states, oldest first. After a reset the window is
+    filled with the first frame of the episode. The replay buffer keeps
+    single frames and rebuilds the same stacks when sampling.
+    """
+
+    def __init__(self, k, frame_shape, num_envs=1):
+        self.k = k
+        self.channels = frame_shape[0]
+        self.stacks = np.zeros((num_envs, k * frame_shape[0], *frame_shape[1:]), dtype=np.uint8)
+
+    @property
+    def shape(self):
+        return self.stacks.shape[1:]
+
+    def reset(self, frames, index=None):
+        """Start new episodes from `frames`, for all envs or only env `index`.
+
+        Returns the stacked states of the envs that were reset.
+        """
+        envs = slice(None) if index is None else slice(index, index + 1)
+        frames = np.asarray(frames).reshape(self.stacks[envs].shape[0], self.channels, *self.shape[1:])
+        self.stacks[envs] = np.tile(frames, (1, self.k, 1, 1))
+        return self.stacks[envs].squeeze(0) if index is not None else self.stacks
+
+    def push(self, frames):
+        """Append one new frame per env and return the stacked states."""
+        frames = np.asarray(frames).reshape(len(self.stacks), self.channels, *self.shape[1:])
+        self.stacks[:, :-self.channels] = self.stacks[:, self.channels:]
+        self.stacks[:, -self.channels:] = frames
+        return self.stacks
@@ -1,5 +1,3 @@
-import cv2
-import torch
 import time
 import numpy as np
 import pygame
@@ -9,49 +7,34 @@ from characters import *
 import random
 from util import *
 from walls import *
+from renderer import ObservationRenderer
 import gymnasium as gym
 import os
-from PIL import Image
-
-def load_gif_frames(path, size=None):
-    """Load all frames from a GIF file into a list of Pygame surfaces"""
-    frames = []
-    gif = Image.open(path)
-    
-    try:
-        while True:
-            frame = gif.copy().convert("RGBA")
-            if size:
-                frame = frame.resize(size, Image.Resampling.NEAREST)
-            frame_surface = pygame.image.fromstring(frame.tobytes(), frame.size, frame.mode)
-            frames.append(frame_surface)
-            gif.seek(gif.tell() + 1)
-    except EOFError:
-        pass
-
-    return frames
+from assets import load_image
+from spatial import wall_occupancy
+from profiling import NULL_TIMER
 
+# Observation returned by reset()/step(): one 128x128 grayscale frame
+OBSERVATION_SHAPE = (1, 128, 128)
 
 class TreasureChest:
 
-    def __init__(self, x, y):
-        self.closed_image = pygame.image.load("images/blue_flower.png").convert_alpha()
-        self.opened_image = pygame.image.load("images/blue_flower_opened.png").convert_alpha()  # add a separate opened image
-
+    def __init__(self, x, y, clock=None):
         self.size = 70
-        self.closed_image = pygame.transform.scale(self.closed_image, (self.size, self.size))
-        self.opened_image = pygame.transform.scale(self.opened_image, (self.size, self.size))
+        self.closed_image = load_image("images/blue_flower.png", size=(self.size, self.size))
+        self.opened_image = load_image("images/blue_flower_opened.png", size=(self.size, self.size))  # add a separate opened image
 
         self.rect = pygame.Rect(x, y, self.size, self.size)
         self.is_opened = False
         self.open_time = None  # for optional visual timing effect
+        self.clock = clock if clock is not None else pygame.time
 
     def draw(self, screen, camera_x, camera_y):
         # When opened, show the opened chest for a moment before disappearing
         if self.is_opened:
             if self.open_time is None:
-                self.open_time = pygame.time.get_ticks()
-            elif pygame.time.get_ticks() - self.open_time > 1000:  # show for 1 second
+                self.open_time = self.clock.get_ticks()
+            elif self.clock.get_ticks() - self.open_time > 1000:  # show for 1 second
                 return  # don't draw anymore
             screen.blit(self.opened_image, (self.rect.x - camera_x, self.rect.y - camera_y))
         else:
@@ -62,9 +45,8 @@ class TreasureChest:
 class HealthDrop:
 
     def __init__(self, x, y):
-        self.image = pygame.image.load("images/blood.png").convert_alpha()
         self.size = 60
-        self.image = pygame.transform.scale(self.image, (self.size, self.size))
+        self.image = load_image("images/blood.png", size=(self.size, self.size))
 
         self.x = x
         self.y = y
@@ -110,8 +92,7 @@ class ZombieShooter():
         self.font = pygame.font.SysFont(None, 36)
 
         # Load and prepare textures
-        self.floor_texture = pygame.image.load("images/floor.jpg").convert()
-        self.floor_texture = pygame.transform.scale(self.floor_texture, (150, 150))
+        self.floor_texture = load_image("images/floor.jpg", size=(150, 150), alpha=False)
         
         # Create floor pattern surface
         self.floor_pattern = pygame.Surface((self.world_width, self.world_height))
@@ -119,8 +100,16 @@ class ZombieShooter():
             for x in range(0, self.world_width, 120):
                 self.floor_pattern.blit(self.floor_texture, (x, y))
 
+        self.obs_renderer = ObservationRenderer(window_width=self.window_width, window_height=self.window_height,
+                                                world_width=self.world_width, world_height=self.world_height,
+                                                floor_pattern=self.floor_pattern, obs_shape=OBSERVATION_SHAPE[1:])
+
         self.clock = pygame.time.Clock()
         self.fps = fps
+        # Game time for all timed mechanics; advanced once per _step
+        self.sim_clock = SimClock(fps)
+        # Phase timing for profiling runs; replace with a profiling.PhaseTimer to enable
+        self.timer = NULL_TIMER
 
         self.walls = walls_1
         self.announcement_font = pygame.font.SysFont(None, 72)
@@ -138,6 +127,7 @@ class ZombieShooter():
 
 
         self.action_space = gym.spaces.Discrete(7)
+        self.observation_space = gym.spaces.Box(low=0, high=255, shape=OBSERVATION_SHAPE, dtype=np.uint8)
 
         if self.sound:
             pygame.mixer.pre_init(44100, -16, 2, 64)
@@ -170,6 +160,8 @@ class ZombieShooter():
         self.max_zombie_count = 5
         self.zombie_top_speed = 2
         self.total_frames = 0
+        self.sim_clock.reset()
+        self.last_walk_play_time = 0
         self.last_bullet_frame = 0
         self.shotgun_ammo = 0
         self.out_of_ammo_message_displayed = False
@@ -177,7 +169,7 @@ class ZombieShooter():
         self.gun_type = "single"
 
         self.bullets = []
-        self.zombies = []
+        self.zombies = MonsterStore(world_width=self.world_width, world_height=self.world_height)
         self.effects = []
         self.burning = []
         self.blood_burst_charges = 0
@@ -186,39 +178,60 @@ class ZombieShooter():
         self.last_kick_time = -999999
         self.kick_cooldown_ms = 500
         self.screen_shake_end = 0
+        self.announcement = None
+        self.announcement_end = 0
 
         return self._get_obs(), self._get_info()
 
     def play_walking_sound(self):
 
         if self.sound:
-            current_time = pygame.time.get_ticks()
+            current_time = self.sim_clock.get_ticks()
             if(current_time - self.last_walk_play_time > 1000):
                 self.footstep.play()
                 self.last_walk_play_time = current_time
 
+    def show_announcement(self, text, duration_ms, hold=False):
+        """Show `text` centred on screen for `duration_ms` of game time.
+
+        The message is drawn over the following frames by draw_announcement(),
+        so step() never sleeps; headless envs skip announcements entirely.
+        hold=True is for terminal screens: there are no later frames, so a
+        human-mode window keeps the message up before the episode ends.
+        """
+        if not self.human:
+            return
+
+        self.announcement = self.announcement_font.render(text, True, (255, 0, 0))
+        self.announcement_end = self.sim_clock.get_ticks() + duration_ms
+
+        if hold:
+            self.draw_announcement()
+            pygame.display.flip()
+            pygame.time.wait(duration_ms)
+
+    def draw_announcement(self):
+        if self.announcement is None:
+            return
+
+        if self.sim_clock.get_ticks() > self.announcement_end:
+            self.announcement = None
+            return
+
+        announcement_rect = self.announcement.get_rect(center=(self.window_width // 2, self.window_height // 2))
+        self.screen.blit(self.announcement, announcement_rect)
+
     def start_next_level(self):
         self.level += 1
 
         # Nếu đã vượt qua level 5 thì thắng
         if self.level > 5:
-            win_surface = self.announcement_font.render("🎉 You Won! 🎉", True, (255, 0, 0))
-            win_rect = win_surface.get_rect(center=(self.window_width // 2, self.window_height // 2))
-            self.screen.blit(win_surface, win_rect)
-            pygame.display.flip()
-            pygame.time.wait(4000)
+            self.show_announcement("🎉 You Won! 🎉", 4000, hold=True)
             self.done = True
             return
 
-        # Hiển thị thông báo chuyển cấp
-        next_level_surface = self.announcement_font.render(f"Starting Level {self.level}", True, (255, 0, 0))
-        next_level_rect = next_level_surface.get_rect(center=(self.window_width // 2, self.window_height // 2))
-        self.screen.blit(next_level_surface, next_level_rect)
-        pygame.display.flip()
-        pygame.time.wait(2500)
-
         # Reset entities
-        self.zombies = []
+        self.zombies.clear()
         self.bullets = []
         self.treasure_chest = None
         self.health_drop = None
@@ -241,7 +254,7 @@ class ZombieShooter():
 
         # Sinh rương thưởng ngẫu nhiên
         x, y = random.randint(100, self.world_width - 150), random.randint(100, self.world_height - 150)
-        self.treasure_chest = TreasureChest(x, y)
+        self.treasure_chest = TreasureChest(x, y, clock=self.sim_clock)
 
         # Tăng độ khó mỗi cấp
         self.zombie_top_speed += 1
@@ -250,45 +263,38 @@ class ZombieShooter():
         # Spawn lại người chơi
         self.player = Player(world_height=self.world_height, world_width=self.world_width, walls=self.walls)
 
-        pygame.display.flip()
-        pygame.time.wait(4000)
-
         if self.level > 3:
             self.done = True
         #    pygame.quit()
          #   sys.exit()
 
-    def game_over(self):
-
-        game_over_surface = self.announcement_font.render('You Died', True, (255, 0, 0)) # Red text
-
-        game_over_rect = game_over_surface.get_rect(center=(self.window_width // 2, self.window_height // 2))
+        # Hiển thị thông báo chuyển cấp (overlay on the next frames of the new level)
+        self.show_announcement(f"Starting Level {self.level}", 2500, hold=self.done)
 
-        self.screen.blit(game_over_surface, game_over_rect)
-
-        pygame.display.flip()
+    def game_over(self):
 
         self.done = True
 
         if self.sound:
             self.zombie_snarl.play()
 
-        if(self.human):
-            pygame.time.wait(2000)
+        self.show_announcement('You Died', 2000, hold=True)
 
-
-        
         # Quit the game. 
         # pygame.quit()
         # sys.exit()
 
 
-    def fill_background(self):
-        # Get camera position
+    def get_camera(self):
         camera_x = self.player.x - self.window_width // 2
         camera_y = self.player.y - self.window_height // 2
         camera_x = max(0, min(camera_x, self.world_width - self.window_width))
         camera_y = max(0, min(camera_y, self.world_height - self.window_height))
+        return camera_x, camera_y
+
+    def fill_background(self):
+        # Get camera position
+        camera_x, camera_y = self.get_camera()
         
         # Draw the floor pattern
         self.screen.blit(self.floor_pattern, (-camera_x, -camera_y))
@@ -297,7 +303,7 @@ class ZombieShooter():
         # Walls are drawn in fill_background as solid rectangles
 
         # Screen shake
-        now = pygame.time.get_ticks()
+        now = self.sim_clock.get_ticks()
         shake_x = 0
         shake_y = 0
         if hasattr(self, 'screen_shake_end') and now < self.screen_shake_end:
@@ -340,7 +346,7 @@ class ZombieShooter():
         self.screen.blit(kick_surface, (10 + shake_x, 110 + shake_y))
 
         if self.out_of_ammo_message_displayed:
-            elapsed = pygame.time.get_ticks() - self.out_of_ammo_start_time
+            elapsed = self.sim_clock.get_ticks() - self.out_of_ammo_start_time
             if elapsed <= 2000:  # 2 giây
                 if self.blood_burst_charges <= 0:
                     msg = "No Blood Burst charges! Find treasure chests!"
@@ -362,7 +368,8 @@ class ZombieShooter():
             delay_ms=0,     # hit immediately
             active_ms=150,  # hit active for 0.15s
             reach=80,       # range of kick
-            damage=2        # how much damage it deals
+            damage=2,       # how much damage it deals
+            clock=self.sim_clock
         ))
         if self.sound:
             self.zombie_hit.play()
@@ -371,10 +378,10 @@ class ZombieShooter():
         # Blood Demon Art: Blood Burst - needs charges to use
         if self.blood_burst_charges <= 0:
             self.out_of_ammo_message_displayed = True
-            self.out_of_ammo_start_time = pygame.time.get_ticks()
+            self.out_of_ammo_start_time = self.sim_clock.get_ticks()
             return
 
-        now = pygame.time.get_ticks()
+        now = self.sim_clock.get_ticks()
         if now < self.last_burst_time + self.burst_cooldown_ms:
             self.out_of_ammo_message_displayed = True
             return
@@ -390,7 +397,8 @@ class ZombieShooter():
             dot_duration_ms=3000,   # burning lasts 3 seconds
             damage=1,               # initial hit damage
             dot_damage_per_tick=1,  # damage per burning tick
-            tick_interval_ms=1000   # tick every second
+            tick_interval_ms=1000,  # tick every second
+            clock=self.sim_clock
         ))
 
         self.last_burst_time = now
@@ -399,6 +407,49 @@ class ZombieShooter():
         if self.sound:
             self.shotgun_blast.play()
 
+    def draw_frame(self, camera_x, camera_y, unlock_msg=None):
+        self.fill_background()
+        self.timer.lap("env_step/fill_background")
+
+        for bullet in self.bullets:
+            bullet.draw(self.screen, camera_x, camera_y)
+
+        # Draw effects under everything else
+        for effect in self.effects:
+            effect.draw(self.screen, camera_x, camera_y)
+            # burning indicator
+            if isinstance(effect, BloodBurst):
+                burning = np.isin(self.zombies.id[:len(self.zombies)], list(effect.dot_targets))
+                for i in np.flatnonzero(burning):
+                    # draw burning effect on affected zombies
+                    z_center_x, z_center_y = self.zombies.rect(i).center
+                    pygame.draw.circle(self.screen, (255, 120, 180, 120), (z_center_x - camera_x, z_center_y - camera_y), 25)
+
+        # Draw entities
+        self.player.draw(self.screen, camera_x, camera_y)
+        self.zombies.draw(self.screen, camera_x, camera_y)
+
+        if self.health_drop:
+            self.health_drop.draw(self.screen, camera_x, camera_y) 
+
+        pygame.draw.rect(self.screen, self.border_color, (0 - camera_x, 0 - camera_y, self.world_width, self.world_height), 5)
+
+        for wall in self.walls:
+            pygame.draw.rect(self.screen, self.wall_color, (wall.x - camera_x, wall.y - camera_y, wall.width, wall.height))
+
+        if self.treasure_chest:
+            self.treasure_chest.draw(self.screen, camera_x, camera_y)
+
+        if unlock_msg is not None:
+            msg_rect = unlock_msg.get_rect(center=(self.window_width // 2, self.window_height // 2))
+            self.screen.blit(unlock_msg, msg_rect)
+
+        self.draw_announcement()
+        self.timer.lap("env_step/draw")
+
+        pygame.display.flip() # Updates the display
+        self.timer.lap("env_step/flip")
+
     def _get_info(self):
 
         gun_type_num = 1 if "single" in self.gun_type else 2
@@ -412,11 +463,8 @@ class ZombieShooter():
         }
     
     def _get_obs(self):
-        # Get the screen image
-        screen_array = pygame.surfarray.pixels3d(self.screen)
-        screen_array = np.transpose(screen_array, (1, 0, 2))
-        downscaled_image = cv2.resize(screen_array, (128, 128), interpolation=cv2.INTER_NEAREST)
-        grayscale = cv2.cvtColor(downscaled_image, cv2.COLOR_RGB2GRAY)
+        # Draw the observation directly at its final resolution
+        grayscale = self.obs_renderer.render(self, *self.get_camera())
 
         # Add Blood Burst charges as an overlay in top-right corner
         # This makes the charges visible to the AI in a visual way
@@ -429,7 +477,8 @@ class ZombieShooter():
         # Overlay charges onto main observation
         grayscale[0:10, 118:128] = charges_area
 
-        observation = torch.from_numpy(grayscale).float().unsqueeze(0)
+        # uint8 all the way to the model; copy since the renderer reuses its canvas
+        observation = grayscale[np.newaxis].copy()
         return observation
 
     def toggle_pause(self):
@@ -465,12 +514,23 @@ class ZombieShooter():
             if done:
                 break
 
-        return self._get_obs(), total_reward, done, truncated, self._get_info()
+        self.timer.begin()
+        observation = self._get_obs()
+        self.timer.lap("env_step/get_obs")
+
+        return observation, total_reward, done, truncated, self._get_info()
 
 
     def _step(self, action):
 
         self.total_frames += 1
+        self.sim_clock.tick()
+
+        timer = self.timer
+        timer.begin()
+        timer.count("monsters", len(self.zombies))
+        timer.count("bullets", len(self.bullets))
+        timer.count("effects", len(self.effects))
 
         up = True if action == 1 else False
         down = True if action == 2 else False
@@ -487,7 +547,7 @@ class ZombieShooter():
         old_x, old_y = self.player.x, self.player.y
 
         # Frenzied Kick (instant hit, cooldown enforced by time)
-        now = pygame.time.get_ticks()
+        now = self.sim_clock.get_ticks()
         kick_used = False
         if switch_gun:
             if now >= self.last_kick_time + self.kick_cooldown_ms:
@@ -508,7 +568,7 @@ class ZombieShooter():
             return reward, self.done, truncated
 
         if len(self.zombies) < self.max_zombie_count and random.randint(1, 100) < 3:
-            self.zombies.append(Zombie(world_height=self.world_height, world_width=self.world_width, speed=random.randint(1, self.zombie_top_speed)))
+            self.zombies.spawn(speed=random.randint(1, self.zombie_top_speed))
         
 
         new_player_x = self.player.x
@@ -522,7 +582,7 @@ class ZombieShooter():
 
         new_player_rect = pygame.Rect(new_player_x, self.player.y, self.player.size, self.player.size)
 
-        collision = check_collision(new_player_rect, self.walls)
+        collision = wall_occupancy(self.walls).any_rect(new_player_rect)
 
         if not collision \
             and self.player.x != new_player_x \
@@ -543,7 +603,7 @@ class ZombieShooter():
         
         new_player_rect = pygame.Rect(self.player.x, new_player_y, self.player.size, self.player.size)
 
-        collision = check_collision(new_player_rect, self.walls)
+        collision = wall_occupancy(self.walls).any_rect(new_player_rect)
 
         if not collision \
         and self.player.y != new_player_y \
@@ -565,26 +625,38 @@ class ZombieShooter():
         else:
             reward -= 0.01  # Light penalty for standing still
 
-        camera_x = self.player.x - self.window_width // 2
-        camera_y = self.player.y - self.window_height // 2
-
-        camera_x = max(0, min(camera_x, self.world_width - self.window_width))
-        camera_y = max(0, min(camera_y, self.world_height - self.window_height))
+        camera_x, camera_y = self.get_camera()
         
         # Update animations
         self.player.update()  # Update player animation
-        for zombie in self.zombies:
-            zombie.update()   # Update zombie animations
+        self.zombies.update()  # Update zombie animations
+
+        timer.lap("env_step/player")
 
         # Process projectile hits on zombies
-        self.zombies_temp = []
+        zombies = self.zombies
+        bullet_hit = np.zeros(len(zombies), dtype=bool)
+
+        # Broadphase: monsters each bullet touches, then the original per-monster
+        # order (earliest bullet in the list wins, each bullet hits once)
+        bullet_targets = {}
+        for b, bullet in enumerate(self.bullets):
+            r = bullet.rect
+            for i in zombies.monster_grid().query_rect(r.x, r.y, r.width, r.height):
+                bullet_targets.setdefault(i, []).append(b)
+
+        spent = set()
+        bullets = list(self.bullets)
+        for i in sorted(bullet_targets):
+            b = next((b for b in bullet_targets[i] if b not in spent), None)
+            if b is not None:
+                spent.add(b)
+                hit_bullet = bullets[b]
+                bullet_hit[i] = True
 
-        for zombie in self.zombies:
-            hit_bullet = get_collision(zombie.rect, self.bullets)
-            if hit_bullet:
                 # Apply bullet damage
                 damage = getattr(hit_bullet, 'damage', 1)
-                zombie.hp -= damage
+                zombies.hp[i] -= damage
 
                 # remove bullet
                 if hit_bullet in self.bullets:
@@ -594,7 +666,7 @@ class ZombieShooter():
                     self.zombie_hit.play()
 
                 # If zombie died, reward and possible drop
-                if zombie.hp <= 0:
+                if zombies.hp[i] <= 0:
                     self.player.score += 1
                     # Higher reward for Blood Burst kills to encourage strategic use
                     if any(isinstance(effect, BloodBurst) for effect in self.effects):
@@ -602,23 +674,24 @@ class ZombieShooter():
                     else:
                         reward += 2
                     if random.randint(1, 100) <= 20:
-                        self.health_drop = HealthDrop(zombie.rect.x, zombie.rect.y)
-                else:
-                    self.zombies_temp.append(zombie)
-
-            elif check_collision(zombie.rect, [self.player.rect]):
-                # Zombie hits player
-                self.player.health -= 1
-                reward -= 5  # Increased penalty to encourage better survival
-                if self.sound:
-                    self.zombie_bite.play()
-            else:
-                self.zombies_temp.append(zombie)
-
-        self.zombies = self.zombies_temp
+                        self.health_drop = HealthDrop(*zombies.rect(i).topleft)
+                    zombies.kill(i)
+
+        # Zombie hits player (each biting zombie is used up)
+        biting = zombies.colliding(self.player.rect) & ~bullet_hit
+        bites = int(biting.sum())
+        if bites:
+            self.player.health -= bites
+            reward -= 5 * bites  # Increased penalty to encourage better survival
+            if self.sound:
+                self.zombie_bite.play()
+            zombies.kill(biting)
+
+        zombies.compact()
+        timer.lap("env_step/bullet_hits")
 
         # Process non-projectile effects (melee, AOE)
-        now = pygame.time.get_ticks()
+        now = self.sim_clock.get_ticks()
         effects_to_keep = []
         kick_hits = 0
         burst_hits = 0
@@ -629,52 +702,50 @@ class ZombieShooter():
 
             # Melee attack: apply when active and not yet processed
             if isinstance(effect, MeleeAttack) and effect.active and not effect.processed:
-                for zombie in list(self.zombies):
-                    if effect.rect.colliderect(zombie.rect):
-                        zombie.hp -= effect.damage
-                        effect.processed = True
-                        kick_hits += 1
-                        # small screen shake
-                        self.screen_shake_end = now + 120
-                        if self.sound:
-                            self.zombie_hit.play()
-                        if zombie.hp <= 0:
-                            self.player.score += 1
-                            reward += 1
-                            if random.randint(1, 100) <= 20:
-                                self.health_drop = HealthDrop(zombie.rect.x, zombie.rect.y)
-                            # remove zombie from list
-                            if zombie in self.zombies:
-                                self.zombies.remove(zombie)
+                for i in np.flatnonzero(zombies.colliding(effect.rect)):
+                    zombies.hp[i] -= effect.damage
+                    effect.processed = True
+                    kick_hits += 1
+                    # small screen shake
+                    self.screen_shake_end = now + 120
+                    if self.sound:
+                        self.zombie_hit.play()
+                    if zombies.hp[i] <= 0:
+                        self.player.score += 1
+                        reward += 1
+                        if random.randint(1, 100) <= 20:
+                            self.health_drop = HealthDrop(*zombies.rect(i).topleft)
+                        # remove zombie from list
+                        zombies.kill(i)
 
             # BloodBurst: expand and apply initial damage + DOT
             if isinstance(effect, BloodBurst):
                 # check zombies within current radius
-                for zombie in list(self.zombies):
-                    dx = zombie.x - effect.x
-                    dy = zombie.y - effect.y
-                    dist = (dx*dx + dy*dy)**0.5
-                    if dist <= effect.current_radius:
-                        if zombie not in effect.dot_targets:
-                            # initial hit
-                            zombie.hp -= effect.damage
-                            effect.dot_targets[zombie] = now + effect.dot_duration_ms
-                            burst_hits += 1
-                            # schedule burning ticks
-                            self.burning.append({
-                                'zombie': zombie,
-                                'end_time': now + effect.dot_duration_ms,
-                                'next_tick': now + effect.tick_interval_ms
-                            })
-                            if self.sound:
-                                self.zombie_hit.play()
-                            if zombie.hp <= 0:
-                                self.player.score += 1
-                                reward += 1
-                                if random.randint(1, 100) <= 20:
-                                    self.health_drop = HealthDrop(zombie.rect.x, zombie.rect.y)
-                                if zombie in self.zombies:
-                                    self.zombies.remove(zombie)
+                # the grid narrows it to monsters whose box touches the circle;
+                # the hit test itself is still on the top-left corner
+                for i in zombies.near_circle(effect.x, effect.y, effect.current_radius):
+                    if np.hypot(zombies.x[i] - effect.x, zombies.y[i] - effect.y) > effect.current_radius \
+                            or int(zombies.id[i]) in effect.dot_targets:
+                        continue
+                    zombie_id = int(zombies.id[i])
+                    # initial hit
+                    zombies.hp[i] -= effect.damage
+                    effect.dot_targets[zombie_id] = now + effect.dot_duration_ms
+                    burst_hits += 1
+                    # schedule burning ticks
+                    self.burning.append({
+                        'zombie': zombie_id,
+                        'end_time': now + effect.dot_duration_ms,
+                        'next_tick': now + effect.tick_interval_ms
+                    })
+                    if self.sound:
+                        self.zombie_hit.play()
+                    if zombies.hp[i] <= 0:
+                        self.player.score += 1
+                        reward += 1
+                        if random.randint(1, 100) <= 20:
+                            self.health_drop = HealthDrop(*zombies.rect(i).topleft)
+                        zombies.kill(i)
 
             effects_to_keep.append(effect)
 
@@ -687,124 +758,90 @@ class ZombieShooter():
             reward += 0.5 * (burst_hits - 1)  # Bonus for each additional hit
 
         # Process burning DOT
-        now = pygame.time.get_ticks()
+        now = self.sim_clock.get_ticks()
         burning_to_keep = []
         for burn in self.burning:
             if now >= burn['next_tick']:
-                zombie = burn['zombie']
-                if zombie in self.zombies:  # ensure zombie still exists
-                    zombie.hp -= 1  # apply DOT tick damage
-                    if zombie.hp <= 0:
+                i = zombies.index_of(burn['zombie'])
+                if i >= 0:  # ensure zombie still exists
+                    zombies.hp[i] -= 1  # apply DOT tick damage
+                    if zombies.hp[i] <= 0:
                         self.player.score += 1
                         reward += 1
                         if random.randint(1, 100) <= 20:
-                            self.health_drop = HealthDrop(zombie.rect.x, zombie.rect.y)
-                        self.zombies.remove(zombie)
+                            self.health_drop = HealthDrop(*zombies.rect(i).topleft)
+                        zombies.kill(i)
                     else:
                         burn['next_tick'] += 1000  # schedule next tick
                         if now < burn['end_time']:  # keep if not expired
                             burning_to_keep.append(burn)
         self.burning = burning_to_keep
         burning_keep = []
-        now = pygame.time.get_ticks()
+        now = self.sim_clock.get_ticks()
         for b in self.burning:
-            zombie = b['zombie']
-            if zombie not in self.zombies:
+            i = zombies.index_of(b['zombie'])
+            if i < 0:
                 continue
             if now >= b['next_tick'] and now <= b['end_time']:
                 # apply tick damage
-                zombie.hp -= 1
+                zombies.hp[i] -= 1
                 b['next_tick'] = now + 1000
                 if self.sound:
                     self.zombie_hit.play()
-                if zombie.hp <= 0:
+                if zombies.hp[i] <= 0:
                     self.player.score += 1
                     reward += 1
                     if random.randint(1, 100) <= 20:
-                        self.health_drop = HealthDrop(zombie.rect.x, zombie.rect.y)
-                    if zombie in self.zombies:
-                        self.zombies.remove(zombie)
+                        self.health_drop = HealthDrop(*zombies.rect(i).topleft)
+                    zombies.kill(i)
                     continue
             if now < b['end_time']:
                 burning_keep.append(b)
         self.burning = burning_keep
 
-        # Move zombies after damage processing
-        for zombie in self.zombies:
-            zombie.move_toward_player(self.player.x, self.player.y, self.walls)
+        zombies.compact()
+        timer.lap("env_step/effects")
 
-        self.fill_background()
+        # Move zombies after damage processing
+        self.zombies.move_toward_player(self.player.x, self.player.y, self.walls, self.player.size)
+        timer.lap("env_step/monster_movement")
 
-        # Process and draw bullets
+        # Move bullets; drop those that exceeded distance or hit walls
         bullets_to_remove = []
         for bullet in self.bullets:
             # move() now returns False if bullet exceeds max distance
-            if not bullet.move() or check_collision(bullet.rect, self.walls):
+            if not bullet.move() or wall_occupancy(self.walls).any_rect(bullet.rect):
                 bullets_to_remove.append(bullet)
-            else:
-                bullet.draw(self.screen, camera_x, camera_y)
-        
-        # Remove bullets that exceeded distance or hit walls
+
         for bullet in bullets_to_remove:
             if bullet in self.bullets:
                 self.bullets.remove(bullet)
 
-        # Draw effects under everything else
-        for effect in self.effects:
-            effect.draw(self.screen, camera_x, camera_y)
-            # burning indicator
-            if isinstance(effect, BloodBurst):
-                for zombie in self.zombies:
-                    if zombie in effect.dot_targets:
-                        # draw burning effect on affected zombies
-                        z_center_x = zombie.rect.centerx - camera_x
-                        z_center_y = zombie.rect.centery - camera_y
-                        pygame.draw.circle(self.screen, (255, 120, 180, 120), (z_center_x, z_center_y), 25)
-
-        # Draw entities
-        self.player.draw(self.screen, camera_x, camera_y)
-        for zombie in self.zombies:
-            zombie.draw(self.screen, camera_x, camera_y)
-            # draw health bar
-            if hasattr(zombie, 'hp') and hasattr(zombie, 'max_hp'):
-                bar_width = 40
-                hp_ratio = max(0, zombie.hp / zombie.max_hp)
-                pygame.draw.rect(self.screen, (255, 0, 0), 
-                            (zombie.rect.x - camera_x, zombie.rect.y - camera_y - 5, bar_width, 3))
-                pygame.draw.rect(self.screen, (0, 255, 0),
-                            (zombie.rect.x - camera_x, zombie.rect.y - camera_y - 5, int(bar_width * hp_ratio), 3))
-
-        if self.health_drop:
-            self.health_drop.draw(self.screen, camera_x, camera_y) 
-
-        pygame.draw.rect(self.screen, self.border_color, (0 - camera_x, 0 - camera_y, self.world_width, self.world_height), 5)
-
-        for wall in self.walls:
-            pygame.draw.rect(self.screen, self.wall_color, (wall.x - camera_x, wall.y - camera_y, wall.width, wall.height))
-
-        if self.treasure_chest:
-            self.treasure_chest.draw(self.screen, camera_x, camera_y)
-        
+        unlock_msg = None
         if self.treasure_chest and self.player.rect.colliderect(self.treasure_chest):
             if not self.treasure_chest.is_opened:
                 self.treasure_chest.is_opened = True
+                self.treasure_chest.open_time = self.sim_clock.get_ticks()
                 reward += 2  # Increased reward for finding treasure
                 # Give random number of Blood Burst charges (1-3)
                 new_charges = random.randint(1, 3)
                 self.blood_burst_charges += new_charges
                 # Show charges gained message
-                unlock_msg = self.font.render(f"+{new_charges} Blood Burst charges!", True, (200, 50, 200))
-                msg_rect = unlock_msg.get_rect(center=(self.window_width // 2, self.window_height // 2))
-                self.screen.blit(unlock_msg, msg_rect)
-        
+                if self.human:
+                    unlock_msg = self.font.render(f"+{new_charges} Blood Burst charges!", True, (200, 50, 200))
+
         if self.health_drop and self.player.rect.colliderect(self.health_drop.rect):
             self.player.health = min(self.player.health + 1, 100)
             reward += 2
             #print("Heart collected!")
             self.health_drop = None
 
+        timer.lap("env_step/bullets_pickups")
 
-        pygame.display.flip() # Updates the display
+        # Full-resolution frame only when someone is watching; the agent's
+        # observation is drawn separately by self.obs_renderer
+        if self.human:
+            self.draw_frame(camera_x, camera_y, unlock_msg)
 
         if self.player.health <= 0:
             self.game_over()
@@ -813,6 +850,7 @@ class ZombieShooter():
             self.clock.tick(self.fps)
         else:
             self.clock.tick()
+        timer.lap("env_step/clock_tick")
 
         if(self.level_goal <= self.player.score):
             reward += 20  # Big bonus for passing the stage
@@ -0,0 +1,114 @@
+import copy
+import time
+import warnings
+import numpy as np
+import torch
+import torch.nn as nn
+
+
+class _GreedyHeads(nn.Module):
+    """argmax over min(q_1, ..., q_n) in one graph."""
+
+    def __init__(self, members):
+        super(_GreedyHeads, self).__init__()
+        self.members = nn.ModuleList(members)
+
+    def forward(self, x):
+        q_values = torch.stack([member(x) for member in self.members])
+        return q_values.min(dim=0).values.argmax(dim=-1)
+
+
+class InferencePolicy:
+    """Greedy acting policy compiled for small CPU batches.
+
+    Holds dropout-free eval copies of the Q-nets in channels_last layout and
+    traces them once with TorchScript into a single graph that returns
+    argmax(min over heads). The traced graph shares its weights with those
+    copies, so sync() only copies new weights in place and never retraces.
+    States are copied into a reused uint8 input buffer and run under
+    inference_mode.
+
+    With `quantize` the fully connected layers, which hold most of the
+    FLOPs, run as dynamically quantized int8 Linears. Packed int8 weights
+    cannot be updated in place, so sync() then re-quantizes and retraces;
+    use compare_policies() to check it against the fp32 policy first.
+    """
+
+    def __init__(self, members, observation_shape, device='cpu', quantize=False):
+        if quantize and torch.device(device).type != 'cpu':
+            raise ValueError("Dynamic int8 quantization only runs on the CPU")
+        self.device = torch.device(device)
+        self.observation_shape = tuple(observation_shape)
+
+        members = [copy.deepcopy(member) for member in members]
+        for member in members:
+            member.dropout = 0
+        self.heads = _GreedyHeads(members).to(self.device).eval().to(memory_format=torch.channels_last)
+        self.weights = [member.state_dict() for member in self.heads.members]
+        self.quantize = quantize
+
+        self.inputs = self._allocate_inputs(1)
+        self.graph = self._compile()
+
+    def _compile(self):
+        with warnings.catch_warnings():
+            # TorchScript tracing and torch.ao quantization are deprecated upstream
+            # but still the cheapest way here to cut per-call overhead on batches of one
+            warnings.simplefilter("ignore")
+            heads = self.heads
+            if self.quantize:
+                heads = torch.ao.quantization.quantize_dynamic(copy.deepcopy(heads), {nn.Linear}, dtype=torch.qint8)
+            with torch.no_grad():
+                return torch.jit.trace(heads, self.inputs)
+
+    def _allocate_inputs(self, batch_size):
+        return torch.zeros((batch_size, *self.observation_shape), dtype=torch.uint8,
+                           device=self.device).contiguous(memory_format=torch.channels_last)
+
+    @torch.no_grad()
+    def sync(self, source):
+        """Copy weights from a TwinZombieNet or a list of ZombieNets or their state_dicts."""
+        if isinstance(source, (list, tuple)):
+            state_dicts = [member if isinstance(member, dict) else member.state_dict() for member in source]
+        else:
+            state_dicts = [source.member_parameters(i) for i in range(source.num_members)]
+
+        targets = [weights[name] for weights, state_dict in zip(self.weights, state_dicts) for name in state_dict]
+        sources = [value for state_dict in state_dicts for value in state_dict.values()]
+        torch._foreach_copy_(targets, sources)
+
+        if self.quantize:
+            self.graph = self._compile()
+
+    def __call__(self, states):
+        """Greedy actions for a batch of (k*C, H, W) uint8 states, as a numpy array."""
+        states = torch.as_tensor(np.asarray(states)).view(-1, *self.observation_shape)
+        if len(states) != len(self.inputs):
+            self.inputs = self._allocate_inputs(len(states))
+        self.inputs.copy_(states)
+
+        with torch.inference_mode():
+            return self.graph(self.inputs).cpu().numpy()
+
+
+def compare_policies(reference, candidate, states, repeats=3):
+    """Greedy-action agreement and per-state latency of two policies.
+
+    `states` is an (N, k*C, H, W) uint8 array, scored one state at a time
+    as acting does. Returns a dict with the fraction of states where both
+    policies pick the same action and the mean milliseconds per call of
+    each.
+    """
+    states = np.asarray(states)
+    report = {}
+    actions = {}
+    for name, policy in (("reference", reference), ("candidate", candidate)):
+        policy(states[0])
+        start = time.perf_counter()
+        for _ in range(repeats):
+            chosen = np.concatenate([policy(state) for state in states])
+        report[f"{name}_ms"] = (time.perf_counter() - start) * 1000 / (repeats * len(states))
+        actions[name] = chosen
+
+    report["agreement"] = float(np.mean(actions["reference"] == actions["candidate"]))
+    return report
@@ -1,8 +1,6 @@
 import os
 import sys
 import cv2
-import torch
-import numpy as np
 import pygame
 from game import ZombieShooter
 
@@ -65,7 +63,7 @@ while True:
     # --- Save frame if reward changes ---
     if reward != 0:
         print(f"Reward: {reward} | Done: {done}")
-        img_array = torch.clip(observation.squeeze(0), 0, 255).numpy().astype(np.uint8)
+        img_array = observation.squeeze(0)
 
         # Convert RGB -> BGR for OpenCV
         if img_array.shape[-1] == 3:
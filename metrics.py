@@ -0,0 +1,114 @@
+import json
+import os
+import queue
+import threading
+from background import ThreadErrors
+
+
+class WandbExporter():
+    """Forwards metrics records to a wandb run; offline unless WANDB_API_KEY is set."""
+
+    def __init__(self, project, name, config):
+        import wandb
+
+        self.wandb = wandb
+        mode = "online" if os.environ.get("WANDB_API_KEY") else "offline"
+        wandb.init(project=project, name=name, config=config, mode=os.environ.get("WANDB_MODE", mode))
+
+    def export(self, record):
+        values = {key: value for key, value in record.items() if key != "step"}
+        self.wandb.log(values, step=record["step"])
+
+    def export_image(self, name, path, step):
+        self.wandb.log({name: self.wandb.Image(path)}, step=step)
+
+    def close(self):
+        self.wandb.finish()
+
+
+class MetricsLogger():
+    """Averages metrics on the device and writes them as JSON lines to `path` and the exporters from a thread."""
+
+    def __init__(self, path, interval=100, exporters=()):
+        self.path = path
+        self.interval = interval
+        self.exporters = list(exporters)
+
+        self.sums = {}
+        self.counts = {}
+        self.steps = 0
+        self.last_step = 0
+
+        self.queue = queue.Queue()
+        self.errors = ThreadErrors()
+        self.thread = threading.Thread(target=self._run, name="MetricsLogger", daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        with open(self.path, "a") as f:
+            while True:
+                item = self.queue.get()
+                if item is None:
+                    return
+                try:
+                    kind, payload = item
+                    if kind == "record":
+                        f.write(json.dumps(payload) + "\n")
+                        f.flush()
+                        for exporter in self.exporters:
+                            exporter.export(payload)
+                    else:
+                        for exporter in self.exporters:
+                            if hasattr(exporter, "export_image"):
+                                exporter.export_image(*payload)
+                except Exception as e:
+                    self.errors.capture(e)
+
+    def add(self, names, values):
+        """Accumulate a 1-D tensor whose entries are the metrics `names` (a tuple)."""
+        values = values.detach()
+        if names in self.sums:
+            self.sums[names] += values
+            self.counts[names] += 1
+        else:
+            self.sums[names] = values.clone()
+            self.counts[names] = 1
+
+    def step(self, step):
+        """Count one update at global `step`; reduces and queues the means every `interval` updates."""
+        self.last_step = max(self.last_step, step)
+        self.steps += 1
+        if self.steps % self.interval == 0:
+            self.flush()
+
+    def flush(self):
+        if not self.sums:
+            return
+
+        record = {"step": self.last_step}
+        for names, total in self.sums.items():
+            record.update(zip(names, (total / self.counts[names]).tolist()))
+        self.sums.clear()
+        self.counts.clear()
+        self.log(record)
+
+    def log(self, values, step=None):
+        """Queue a dict of plain numbers at `step` (default: the latest step seen)."""
+        self.errors.raise_pending()
+        # Steps never go backwards, which exporters like wandb require
+        self.last_step = max(self.last_step, step or 0)
+        self.queue.put(("record", {"step": self.last_step, **values}))
+
+    def log_image(self, name, path, step=None):
+        """Hand an image file to the exporters that take images."""
+        self.errors.raise_pending()
+        self.queue.put(("image", (name, path, self.last_step if step is None else step)))
+
+    def close(self):
+        """Write what is left, wait for the writer and close the exporters."""
+        self.flush()
+        self.queue.put(None)
+        self.thread.join()
+        for exporter in self.exporters:
+            exporter.close()
+        self.errors.raise_pending()
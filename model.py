@@ -1,6 +1,8 @@
+import copy
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
+from torch.func import functional_call, stack_module_state, vmap
 
 # ZombieNet
 # 4 CNN
@@ -12,8 +14,8 @@ class ZombieNet(nn.Module):
     def __init__(self, action_dim, hidden_dim=1024, dropout = 0, observation_shape=None):
         super(ZombieNet, self).__init__()
 
-        # Convolutional Layers 
-        self.conv1 = nn.Conv2d(in_channels=1, out_channels=8, kernel_size=4, stride=2)
+        # Convolutional Layers (one input channel per stacked frame)
+        self.conv1 = nn.Conv2d(in_channels=observation_shape[0], out_channels=8, kernel_size=4, stride=2)
         self.conv2 = nn.Conv2d(in_channels=8, out_channels=16, kernel_size=4, stride=2)
         self.conv3 = nn.Conv2d(in_channels=16, out_channels=32, kernel_size=3, stride=2)
         self.conv4 = nn.Conv2d(in_channels=32, out_channels=64, kernel_size=3, stride=2)
@@ -55,7 +57,8 @@ class ZombieNet(nn.Module):
         return x.view(-1).shape[0]
 
     def forward(self, x):
-        x = x / 255
+        # Observations arrive as uint8 frames; cast once here
+        x = x.float() / 255
 
         x = self.pool(F.relu(self.conv1(x)))
         x = F.relu(self.conv2(x))
@@ -118,11 +121,58 @@ class ZombieNet(nn.Module):
             print(f"Unexpected error while loading weights from {filename}: {e}")
 
 
+class TwinZombieNet(nn.Module):
+    """Both Q-heads of the agent as one module.
+
+    The weights of `num_members` ZombieNets are stacked along a leading
+    axis and evaluated with torch.func.vmap, so one call runs every head
+    (convs become grouped convs, linears batched matmuls) and returns
+    (num_members, batch, action_dim). One optimizer over parameters()
+    trains all heads. member_state_dict() gives a plain ZombieNet
+    state_dict for saving and for test.py.
+    """
+
+    def __init__(self, action_dim, hidden_dim=1024, dropout = 0, observation_shape=None, num_members=2):
+        super(TwinZombieNet, self).__init__()
+
+        members = [ZombieNet(action_dim=action_dim, hidden_dim=hidden_dim, dropout=dropout,
+                             observation_shape=observation_shape) for _ in range(num_members)]
+        params, _ = stack_module_state(members)
+
+        # ParameterDict keys cannot contain dots
+        self.names = {name: name.replace(".", "_") for name in params}
+        self.stacked = nn.ParameterDict({key: nn.Parameter(params[name]) for name, key in self.names.items()})
+
+        # Stateless copy used only as the function vmap calls; kept out of the module tree
+        object.__setattr__(self, "base", copy.deepcopy(members[0]).to("meta"))
+        self.num_members = num_members
+
+    def _member_forward(self, params, x):
+        return functional_call(self.base, params, (x,))
+
+    def forward(self, x):
+        params = {name: self.stacked[key] for name, key in self.names.items()}
+        # 'different' gives every head its own dropout mask, as separate nets would
+        return vmap(self._member_forward, in_dims=(0, None), randomness="different")(params, x)
+
+    def member_parameters(self, index):
+        """ZombieNet parameter names mapped to views of member `index`'s weights."""
+        return {name: self.stacked[key][index].detach() for name, key in self.names.items()}
+
+    def member_state_dict(self, index):
+        return {name: value.clone() for name, value in self.member_parameters(index).items()}
+
+    def load_member_state_dict(self, index, state_dict):
+        with torch.no_grad():
+            for name, key in self.names.items():
+                self.stacked[key][index].copy_(state_dict[name])
+
+
+@torch.no_grad()
 def soft_update(target, source, tau=0.005):
-    for target_param, param in zip(target.parameters(), source.parameters()):
-        target_param.data.copy_(target_param.data * (1.0 - tau) + param.data * tau)
+    # One fused multi-tensor kernel per call instead of a Python loop over parameters
+    torch._foreach_lerp_(list(target.parameters()), list(source.parameters()), tau)
 
+@torch.no_grad()
 def hard_update(target, source):
-    for target_param, param in zip(target.parameters(), source.parameters()):
-        target_param.data.copy_(param.data)
-
+    torch._foreach_copy_(list(target.parameters()), list(source.parameters()))
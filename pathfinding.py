@@ -0,0 +1,118 @@
+import cv2
+import numpy as np
+from spatial import wall_occupancy
+
+# 8-neighbour moves as (dy, dx), straight ones first so they win ties
+MOVES = [(0, 1), (0, -1), (1, 0), (-1, 0), (1, 1), (1, -1), (-1, 1), (-1, -1)]
+MOVE_Y = np.array([dy for dy, _ in MOVES])
+MOVE_X = np.array([dx for _, dx in MOVES])
+CROSS = cv2.getStructuringElement(cv2.MORPH_CROSS, (3, 3))
+UNREACHABLE = np.iinfo(np.int32).max
+
+
+def _shift(array, dy, dx, fill):
+    """out[r, c] = array[r - dy, c - dx], with `fill` where that falls outside."""
+    out = np.full_like(array, fill)
+    height, width = array.shape
+    out[max(dy, 0):height + min(dy, 0), max(dx, 0):width + min(dx, 0)] = \
+        array[max(-dy, 0):height - max(dy, 0), max(-dx, 0):width - max(dx, 0)]
+    return out
+
+
+class FlowField:
+    """Shortest-path directions toward the player for one monster size.
+
+    Nodes sit every `cell_size` pixels and stand for a monster's top-left
+    corner; a node is passable when a monster box of `size` placed there is
+    inside the world and clear of walls. A breadth-first wavefront from the
+    nodes touching the player gives every node its distance in moves;
+    monsters step to whichever neighbour is closest. The wavefront takes
+    one whole-grid dilation per ring, O(nodes * path length), about 1-2 ms
+    on the default levels; it only runs when the player enters another
+    node, and every monster of this size shares it. Diagonal steps never
+    cut a wall corner.
+    """
+
+    def __init__(self, walls, world_width, world_height, size, cell_size=20):
+        self.cell_size = cell_size
+        self.size = size
+        self.width = (world_width - size) // cell_size + 1
+        self.height = (world_height - size) // cell_size + 1
+
+        rows, cols = np.mgrid[0:self.height, 0:self.width]
+        self.passable = ~wall_occupancy(walls).blocked_many(cols * cell_size, rows * cell_size, size, size)
+
+        # allowed[k, r, c]: stepping from node (r, c) by MOVES[k] stays on free
+        # nodes; diagonal steps also need both straight neighbours free
+        self.allowed = np.zeros((len(MOVES),) + self.passable.shape, dtype=bool)
+        for k, (dy, dx) in enumerate(MOVES):
+            self.allowed[k] = _shift(self.passable, -dy, -dx, False)
+            if dx and dy:
+                self.allowed[k] &= _shift(self.passable, -dy, 0, False) & _shift(self.passable, 0, -dx, False)
+
+        self.goal = None
+        self.distance = None
+        self.padded = None
+
+    def node(self, x, y):
+        """Nearest node (col, row) to pixel positions, clipped to the field."""
+        col = np.clip(np.rint(np.asarray(x) / self.cell_size).astype(np.int64), 0, self.width - 1)
+        row = np.clip(np.rint(np.asarray(y) / self.cell_size).astype(np.int64), 0, self.height - 1)
+        return col, row
+
+    def update(self, player_x, player_y, player_size):
+        """Recompute the field if the player moved into another node."""
+        col, row = self.node(player_x, player_y)
+        goal = (int(row), int(col))
+        if goal == self.goal:
+            return
+        self.goal = goal
+
+        # Goal nodes are the free ones where a monster box would overlap the
+        # player. Two overlapping wall-free boxes cannot have a wall between
+        # them, so this never pulls monsters to the far side of a wall.
+        size, cell = self.size, self.cell_size
+        rows, cols = np.mgrid[0:self.height, 0:self.width]
+        touching = ((cols * cell < player_x + player_size) & (player_x < cols * cell + size)
+                    & (rows * cell < player_y + player_size) & (player_y < rows * cell + size))
+        frontier = touching & self.passable
+
+        distance = np.full(self.passable.shape, UNREACHABLE, dtype=np.int32)
+        distance[frontier] = 0
+
+        # 4-connected wavefront: one dilation per ring, so the cost is a few
+        # whole-grid operations per step of path length
+        frontier = frontier.astype(np.uint8)
+        unvisited = self.passable.astype(np.uint8)
+        unvisited[frontier > 0] = 0
+        steps = 0
+        while True:
+            frontier = cv2.bitwise_and(cv2.dilate(frontier, CROSS), unvisited)
+            if not cv2.countNonZero(frontier):
+                break
+            steps += 1
+            cv2.bitwise_xor(unvisited, frontier, dst=unvisited)
+            distance[frontier.view(bool)] = steps
+
+        self.distance = distance
+        # Padded by one unreachable node so neighbour lookups need no bounds checks
+        self.padded = np.pad(distance, 1, constant_values=UNREACHABLE)
+
+    def waypoints(self, x, y):
+        """Pixel position of the next node toward the player for monsters at (x, y).
+
+        The next node is the allowed neighbour closest to the player, so
+        paths take diagonal shortcuts where both straight neighbours are
+        free. Returns (target_x, target_y, valid); valid is False where the
+        monster's node cannot reach the player or already touches it.
+        """
+        col, row = self.node(x, y)
+        around = self.padded[row[:, None] + 1 + MOVE_Y, col[:, None] + 1 + MOVE_X]
+        around = np.where(self.allowed[:, row, col].T, around, UNREACHABLE)
+        best = around.argmin(axis=1)
+
+        distance = self.distance[row, col]
+        valid = (distance > 0) & (distance != UNREACHABLE)
+        target_x = (col + MOVE_X[best]) * self.cell_size
+        target_y = (row + MOVE_Y[best]) * self.cell_size
+        return target_x.astype(np.float64), target_y.astype(np.float64), valid
@@ -0,0 +1,132 @@
+import csv
+import os
+import time
+from collections import defaultdict
+
+
+class _Phase():
+    """Context manager adding its wall time to one phase of a PhaseTimer."""
+
+    def __init__(self, timer, name):
+        self.timer = timer
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        if self.timer.synchronize is not None:
+            self.timer.synchronize()
+        self.timer.times[self.name] += time.perf_counter() - self.start
+        return False
+
+
+class PhaseTimer():
+    """Wall time per named phase plus entity counters, reported per window.
+
+    Straight-line code is timed with begin() and lap(name), which charges
+    the time since the previous mark to `name`; nested or scattered code
+    uses `with timer.phase(name)`. count(name, value) averages a value per
+    call (e.g. monsters alive per frame) and add_steps(n) counts agent
+    steps, which the report divides phase times by. `synchronize` (e.g.
+    torch.cuda.synchronize) runs before each reading so asynchronous GPU
+    work is charged to the phase that queued it.
+
+    A phase named "outer/inner" is timed inside phase "outer" (e.g. the
+    env's own env_step/player inside env_step): it breaks that time down
+    and is already counted in it.
+    """
+
+    enabled = True
+
+    def __init__(self, synchronize=None):
+        self.synchronize = synchronize
+        self.phases = {}
+        self.reset()
+
+    def reset(self):
+        self.times = defaultdict(float)
+        self.counts = defaultdict(float)
+        self.count_calls = defaultdict(int)
+        self.steps = 0
+        self.window_start = time.perf_counter()
+        self.mark = self.window_start
+
+    def begin(self):
+        self.mark = time.perf_counter()
+
+    def lap(self, name):
+        if self.synchronize is not None:
+            self.synchronize()
+        now = time.perf_counter()
+        self.times[name] += now - self.mark
+        self.mark = now
+
+    def phase(self, name):
+        # One reusable context manager per name; phases of one name do not nest
+        phase = self.phases.get(name)
+        if phase is None:
+            phase = self.phases[name] = _Phase(self, name)
+        return phase
+
+    def count(self, name, value):
+        self.counts[name] += value
+        self.count_calls[name] += 1
+
+    def add_steps(self, n=1):
+        self.steps += n
+
+    def report(self):
+        """(kind, name, value) rows for the window since the last reset."""
+        seconds = time.perf_counter() - self.window_start
+        steps = max(self.steps, 1)
+        rows = [("rate", "steps_per_sec", self.steps / seconds if seconds > 0 else 0.0)]
+        rows += [("ms_per_step", name, total * 1000 / steps) for name, total in sorted(self.times.items())]
+        rows += [("mean", name, total / self.count_calls[name]) for name, total in sorted(self.counts.items())]
+        return rows
+
+    def write_report(self, path, episode):
+        """Append this window's report to the CSV at `path` and start a new window."""
+        new_file = not os.path.exists(path)
+        with open(path, "a", newline="") as f:
+            writer = csv.writer(f)
+            if new_file:
+                writer.writerow(["Episode", "Steps", "Kind", "Name", "Value"])
+            for kind, name, value in self.report():
+                writer.writerow([episode, self.steps, kind, name, f"{value:.4f}"])
+        self.reset()
+
+
+class _NullPhase():
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class NullTimer():
+    """PhaseTimer stand-in used when profiling is off; every call is a no-op."""
+
+    enabled = False
+    _phase = _NullPhase()
+
+    def begin(self):
+        pass
+
+    def lap(self, name):
+        pass
+
+    def phase(self, name):
+        return self._phase
+
+    def count(self, name, value):
+        pass
+
+    def add_steps(self, n=1):
+        pass
+
+
+NULL_TIMER = NullTimer()
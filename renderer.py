@@ -0,0 +1,197 @@
+import cv2
+import numpy as np
+import pygame
+from bullet import MeleeAttack, BloodBurst
+from characters import MonsterStore
+from assets import DIRECTIONS
+from spatial import level_cache
+
+# Gray levels of the solid colours the full-resolution renderer uses
+WALL_GRAY = 50            # (50, 50, 50)
+BORDER_GRAY = 76          # (255, 0, 0)
+BURN_GRAY = 167           # (255, 120, 180)
+BURST_GRAY = 215          # pink/white burst gradient
+HP_BAR_RED = 76           # (255, 0, 0)
+HP_BAR_GREEN = 150        # (0, 255, 0)
+
+
+def surface_to_gray(surface):
+    """Grayscale pixels and opacity mask of a pygame Surface, as (h, w) arrays."""
+    rgb = np.transpose(pygame.surfarray.array3d(surface), (1, 0, 2))
+    gray = cv2.cvtColor(np.ascontiguousarray(rgb), cv2.COLOR_RGB2GRAY)
+    if surface.get_flags() & pygame.SRCALPHA:
+        mask = np.transpose(pygame.surfarray.array_alpha(surface)) > 127
+    else:
+        mask = np.ones(gray.shape, dtype=bool)
+    return gray, mask
+
+
+class ObservationRenderer:
+    """Draws the agent's observation straight into a small grayscale canvas.
+
+    Instead of rendering the full window and downscaling it, walls, floor,
+    monsters, the player, pickups and effects are drawn with sprites that
+    were downscaled once, through a camera transform scaled to the
+    observation size. HUD text is not drawn; the Blood Burst charges are
+    added by ZombieShooter._get_obs as before.
+    """
+
+    def __init__(self, window_width, window_height, world_width, world_height, floor_pattern, obs_shape):
+        self.obs_height, self.obs_width = obs_shape
+        self.scale_x = self.obs_width / window_width
+        self.scale_y = self.obs_height / window_height
+        self.world_width = world_width
+        self.world_height = world_height
+
+        self.canvas = np.zeros((self.obs_height, self.obs_width), dtype=np.uint8)
+
+        # Whole-world floor at observation scale; the camera crops a window out of it
+        world_obs_width = round(world_width * self.scale_x)
+        world_obs_height = round(world_height * self.scale_y)
+        floor_gray, _ = surface_to_gray(floor_pattern)
+        self.floor = cv2.resize(floor_gray, (world_obs_width, world_obs_height), interpolation=cv2.INTER_NEAREST)
+
+        # Downscaled sprites keyed by what they show, e.g. ("player", "up", 2)
+        self.sprites = {}
+
+        self.grid_y, self.grid_x = np.mgrid[0:self.obs_height, 0:self.obs_width]
+
+    def _overlay(self, walls):
+        """Per-level wall + border overlay at observation scale, as (gray, mask)."""
+        key = ("overlay", self.floor.shape, self.scale_x, self.scale_y)
+        return level_cache(walls, key, lambda: self._build_overlay(walls))
+
+    def _build_overlay(self, walls):
+        height, width = self.floor.shape
+        mask = np.zeros((height, width), dtype=bool)
+        gray = np.zeros((height, width), dtype=np.uint8)
+
+        for wall in walls:
+            x0, y0 = self._to_obs(wall.x, wall.y)
+            x1, y1 = self._to_obs(wall.right, wall.bottom)
+            mask[y0:max(y1, y0 + 1), x0:max(x1, x0 + 1)] = True
+        gray[mask] = WALL_GRAY
+
+        # 5 px red border drawn inside the world edge
+        bx, by = self._to_obs(5, 5)
+        border = np.zeros_like(mask)
+        border[:max(by, 1), :] = border[-max(by, 1):, :] = True
+        border[:, :max(bx, 1)] = border[:, -max(bx, 1):] = True
+        gray[border & ~mask] = BORDER_GRAY
+        mask |= border
+        return gray, mask
+
+    def _to_obs(self, x, y):
+        return int(round(x * self.scale_x)), int(round(y * self.scale_y))
+
+    def sprite(self, key, surface):
+        if key not in self.sprites:
+            gray, mask = surface_to_gray(surface)
+            width, height = surface.get_size()
+            size = (max(1, round(width * self.scale_x)), max(1, round(height * self.scale_y)))
+            gray = cv2.resize(gray, size, interpolation=cv2.INTER_NEAREST)
+            mask = cv2.resize(mask.astype(np.uint8), size, interpolation=cv2.INTER_NEAREST).astype(bool)
+            self.sprites[key] = (gray, mask)
+        return self.sprites[key]
+
+    def blit(self, sprite, x, y):
+        """Paste a (gray, mask) sprite with its top-left at observation pixel (x, y)."""
+        gray, mask = sprite
+        height, width = gray.shape
+        x0, y0 = max(x, 0), max(y, 0)
+        x1, y1 = min(x + width, self.obs_width), min(y + height, self.obs_height)
+        if x0 >= x1 or y0 >= y1:
+            return
+
+        src_mask = mask[y0 - y:y1 - y, x0 - x:x1 - x]
+        self.canvas[y0:y1, x0:x1][src_mask] = gray[y0 - y:y1 - y, x0 - x:x1 - x][src_mask]
+
+    def fill_rect(self, x, y, width, height, value):
+        x0, y0 = max(x, 0), max(y, 0)
+        x1, y1 = min(x + width, self.obs_width), min(y + height, self.obs_height)
+        if x0 < x1 and y0 < y1:
+            self.canvas[y0:y1, x0:x1] = value
+
+    def ellipse_mask(self, cx, cy, radius):
+        rx = max(radius * self.scale_x, 0.5)
+        ry = max(radius * self.scale_y, 0.5)
+        return ((self.grid_x - cx) / rx) ** 2 + ((self.grid_y - cy) / ry) ** 2 <= 1
+
+    def render(self, env, camera_x, camera_y):
+        """Return the observation canvas for `env` seen from (camera_x, camera_y)."""
+        canvas = self.canvas
+        ox, oy = self._to_obs(camera_x, camera_y)
+
+        def to_screen(x, y):
+            return self._to_obs(x - camera_x, y - camera_y)
+
+        # Floor
+        canvas[:] = self.floor[oy:oy + self.obs_height, ox:ox + self.obs_width]
+
+        # Effects under everything else
+        for effect in env.effects:
+            if isinstance(effect, BloodBurst) and effect.current_radius > 0:
+                cx, cy = to_screen(effect.x, effect.y)
+                burst = self.ellipse_mask(cx, cy, effect.current_radius)
+                canvas[burst] = (canvas[burst] * 0.4 + BURST_GRAY * 0.6).astype(np.uint8)
+
+                # burning indicator on affected monsters
+                zombies = env.zombies
+                burning = np.isin(zombies.id[:len(zombies)], list(effect.dot_targets))
+                for i in np.flatnonzero(burning):
+                    center = zombies.rect(i).center
+                    canvas[self.ellipse_mask(*to_screen(*center), 25)] = BURN_GRAY
+
+            elif isinstance(effect, MeleeAttack) and effect.active and effect.current_frame < len(effect.frames):
+                frame = effect.frames[effect.current_frame]
+                self.blit(self.sprite(("slash", effect.direction, effect.current_frame), frame),
+                          *to_screen(effect.rect.x, effect.rect.y))
+
+        # Player
+        player = env.player
+        frame = player.animations[player.direction][player.frame_index]
+        self.blit(self.sprite(("player", player.direction, player.frame_index), frame),
+                  *to_screen(player.x, player.y))
+
+        # Monsters + health bars
+        zombies = env.zombies
+        bar_width, bar_height = self._to_obs(40, 3)
+        for i in range(len(zombies)):
+            if not zombies.alive[i]:
+                continue
+
+            size = int(zombies.size[i])
+            if zombies.appear_timer[i] > 0:
+                sprite = self.sprite(("appear", size), MonsterStore.appear_image(size))
+            else:
+                direction = DIRECTIONS[zombies.direction[i]]
+                frames = MonsterStore.sprites(zombies.type[i])[direction]
+                index = int(zombies.frame_index[i] % len(frames))
+                sprite = self.sprite(("monster", int(zombies.type[i]), direction, index), frames[index])
+
+            x, y = to_screen(zombies.x[i], zombies.y[i])
+            self.blit(sprite, x, y)
+
+            bar_y = to_screen(0, int(zombies.y[i]) - 5)[1]
+            hp_width = round(bar_width * max(0, zombies.hp[i] / zombies.max_hp[i]))
+            self.fill_rect(x, bar_y, bar_width, max(bar_height, 1), HP_BAR_RED)
+            self.fill_rect(x, bar_y, hp_width, max(bar_height, 1), HP_BAR_GREEN)
+
+        if env.health_drop:
+            self.blit(self.sprite(("health_drop",), env.health_drop.image),
+                      *to_screen(env.health_drop.x, env.health_drop.y))
+
+        # Border and walls on top
+        overlay_gray, overlay_mask = self._overlay(env.walls)
+        window = (slice(oy, oy + self.obs_height), slice(ox, ox + self.obs_width))
+        visible = overlay_mask[window]
+        canvas[visible] = overlay_gray[window][visible]
+
+        chest = env.treasure_chest
+        if chest:
+            if not chest.is_opened:
+                self.blit(self.sprite(("chest", False), chest.closed_image), *to_screen(chest.rect.x, chest.rect.y))
+            elif env.sim_clock.get_ticks() - chest.open_time <= 1000:
+                self.blit(self.sprite(("chest", True), chest.opened_image), *to_screen(chest.rect.x, chest.rect.y))
+
+        return canvas
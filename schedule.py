@@ -0,0 +1,55 @@
+class TrainSchedule:
+    """When the learner takes gradient steps and refreshes its target networks.
+
+    Every `train_freq` env transitions (counted over all envs) the learner
+    takes `gradient_steps` gradient steps, once `learning_starts`
+    transitions have been collected. The target networks move toward the
+    online ones every `target_update_interval` gradient steps, by Polyak
+    averaging with `tau` or as a full copy when `tau` is 1. The acting
+    policy gets the learner's weights every `policy_sync_interval`
+    gradient steps.
+    """
+
+    def __init__(self, train_freq=1, gradient_steps=1, learning_starts=0, target_update_interval=4, tau=0.005,
+                 policy_sync_interval=1):
+        if train_freq < 1 or gradient_steps < 0 or target_update_interval < 1 or policy_sync_interval < 1:
+            raise ValueError("train_freq and the update intervals must be >= 1 and gradient_steps >= 0")
+        if not 0 < tau <= 1:
+            raise ValueError(f"tau must be in (0, 1], got {tau}")
+
+        self.train_freq = train_freq
+        self.gradient_steps = gradient_steps
+        self.learning_starts = learning_starts
+        self.target_update_interval = target_update_interval
+        self.tau = tau
+        self.policy_sync_interval = policy_sync_interval
+
+        self.env_steps = 0
+        self.updates = 0
+
+    def config(self):
+        return {
+            "train_freq": self.train_freq,
+            "gradient_steps": self.gradient_steps,
+            "learning_starts": self.learning_starts,
+            "target_update_interval": self.target_update_interval,
+            "tau": self.tau,
+            "policy_sync_interval": self.policy_sync_interval,
+        }
+
+    def step(self, transitions=1):
+        """Count new env transitions and return how many gradient steps are due."""
+        before = self.env_steps
+        self.env_steps += transitions
+        if self.env_steps < self.learning_starts:
+            return 0
+        return (self.env_steps // self.train_freq - before // self.train_freq) * self.gradient_steps
+
+    def gradient_step(self):
+        """Count one gradient step; True when the targets should be updated after it."""
+        self.updates += 1
+        return self.updates % self.target_update_interval == 0
+
+    def policy_sync_due(self):
+        """True when the acting policy should take the weights of the latest gradient step."""
+        return self.updates % self.policy_sync_interval == 0
@@ -0,0 +1,161 @@
+import math
+import numpy as np
+
+
+class SpatialGrid:
+    """Uniform-grid broadphase over axis-aligned boxes.
+
+    Boxes are bucketed into every cell of `cell_size` they touch, so rect,
+    circle and point queries only test the few boxes that share a cell with
+    the query instead of scanning the whole list. Overlap follows
+    pygame.Rect.colliderect: float coordinates are truncated and touching
+    edges do not count.
+    """
+
+    def __init__(self, boxes=(), cell_size=128):
+        self.cell_size = cell_size
+        self.build(boxes)
+
+    def build(self, boxes):
+        """Index `boxes`, an (N, 4) array-like of x, y, w, h. Query results are row numbers."""
+        self.boxes = np.asarray(boxes, dtype=np.int64).reshape(-1, 4)
+        self.box_list = self.boxes.tolist()
+        self.cells = {}
+
+        for i, (x, y, w, h) in enumerate(self.box_list):
+            if w <= 0 or h <= 0:
+                continue
+            for cell in self._cells(x, y, w, h):
+                self.cells.setdefault(cell, []).append(i)
+
+    def __len__(self):
+        return len(self.box_list)
+
+    def _cells(self, x, y, w, h):
+        size = self.cell_size
+        cx0, cy0 = x // size, y // size
+        cx1, cy1 = (x + w - 1) // size, (y + h - 1) // size
+        return [(cx, cy) for cy in range(cy0, cy1 + 1) for cx in range(cx0, cx1 + 1)]
+
+    def candidates(self, x, y, w, h):
+        """Rows of boxes sharing a cell with the rect (may include non-overlapping ones)."""
+        found = set()
+        for cell in self._cells(int(x), int(y), max(int(w), 1), max(int(h), 1)):
+            found.update(self.cells.get(cell, ()))
+        return sorted(found)
+
+    def query_rect(self, x, y, w, h):
+        """Rows of boxes overlapping the rect (x, y, w, h)."""
+        x, y, w, h = int(x), int(y), int(w), int(h)
+        if w <= 0 or h <= 0:
+            return []
+
+        hits = []
+        for i in self.candidates(x, y, w, h):
+            bx, by, bw, bh = self.box_list[i]
+            if x < bx + bw and bx < x + w and y < by + bh and by < y + h:
+                hits.append(i)
+        return hits
+
+    def any_rect(self, rect):
+        """check_collision(rect, boxes) for a pygame.Rect."""
+        return len(self.query_rect(rect.x, rect.y, rect.width, rect.height)) > 0
+
+    def query_circle(self, cx, cy, radius):
+        """Rows of boxes intersecting the circle of `radius` around (cx, cy)."""
+        hits = []
+        for i in self.candidates(cx - radius, cy - radius, 2 * radius + 1, 2 * radius + 1):
+            bx, by, bw, bh = self.box_list[i]
+            # Closest point of the box to the circle centre
+            dx = cx - min(max(cx, bx), bx + bw)
+            dy = cy - min(max(cy, by), by + bh)
+            if dx * dx + dy * dy <= radius * radius:
+                hits.append(i)
+        return hits
+
+    def query_point(self, px, py):
+        """Rows of boxes containing the point (px, py)."""
+        px, py = int(px), int(py)
+        hits = []
+        for i in self.cells.get((px // self.cell_size, py // self.cell_size), ()):
+            bx, by, bw, bh = self.box_list[i]
+            if bx <= px < bx + bw and by <= py < by + bh:
+                hits.append(i)
+        return hits
+
+
+class OccupancyMap:
+    """Wall occupancy of a level, compiled into a summed-area table.
+
+    The level is rasterised at the largest cell size that divides every wall
+    coordinate (10 px for the current levels), so the bitmap is exact: a box
+    overlaps a wall iff one of the cells it covers is occupied, and that is
+    four table lookups whatever the number of walls. Overlap follows
+    pygame.Rect.colliderect like SpatialGrid. Nothing outside the bounding
+    box of the walls is occupied.
+    """
+
+    def __init__(self, walls):
+        boxes = [(w.x, w.y, w.width, w.height) for w in walls]
+        self.cell_size = math.gcd(*[v for box in boxes for v in box]) or 1
+        size = self.cell_size
+
+        self.width = max((x + w for x, _, w, _ in boxes), default=0) // size
+        self.height = max((y + h for _, y, _, h in boxes), default=0) // size
+        self.occupied = np.zeros((self.height, self.width), dtype=bool)
+        for x, y, w, h in boxes:
+            self.occupied[max(y, 0) // size:(y + h) // size, max(x, 0) // size:(x + w) // size] = True
+
+        # sat[r, c] = occupied cells in rows < r and columns < c
+        self.sat = np.zeros((self.height + 1, self.width + 1), dtype=np.int32)
+        self.sat[1:, 1:] = self.occupied.cumsum(axis=0).cumsum(axis=1)
+
+    def blocked(self, x, y, w, h):
+        """Whether the box (x, y, w, h) overlaps a wall."""
+        x, y, w, h = int(x), int(y), int(w), int(h)
+        if w <= 0 or h <= 0:
+            return False
+
+        size = self.cell_size
+        c0 = min(max(x // size, 0), self.width)
+        c1 = min(max((x + w - 1) // size + 1, 0), self.width)
+        r0 = min(max(y // size, 0), self.height)
+        r1 = min(max((y + h - 1) // size + 1, 0), self.height)
+        sat = self.sat
+        return bool(sat[r1, c1] - sat[r0, c1] - sat[r1, c0] + sat[r0, c0])
+
+    def any_rect(self, rect):
+        """check_collision(rect, walls) for a pygame.Rect."""
+        return self.blocked(rect.x, rect.y, rect.width, rect.height)
+
+    def blocked_many(self, x, y, w, h):
+        """Vectorized blocked() over broadcastable arrays; floats are truncated like Rect."""
+        x = np.trunc(x).astype(np.int64)
+        y = np.trunc(y).astype(np.int64)
+        w = np.asarray(w, dtype=np.int64)
+        h = np.asarray(h, dtype=np.int64)
+
+        size = self.cell_size
+        c0 = np.clip(x // size, 0, self.width)
+        c1 = np.clip((x + w - 1) // size + 1, 0, self.width)
+        r0 = np.clip(y // size, 0, self.height)
+        r1 = np.clip((y + h - 1) // size + 1, 0, self.height)
+        sat = self.sat
+        return ((sat[r1, c1] - sat[r0, c1] - sat[r1, c0] + sat[r0, c0]) > 0) & (w > 0) & (h > 0)
+
+
+# id(walls) -> (walls, {key: value}); holding the list keeps its id from being reused
+_level_caches = {}
+
+
+def level_cache(walls, key, build):
+    """Value `key` for a level's wall list, made by build() once and reused across resets."""
+    values = _level_caches.setdefault(id(walls), (walls, {}))[1]
+    if key not in values:
+        values[key] = build()
+    return values[key]
+
+
+def wall_occupancy(walls):
+    """Occupancy map for a level's wall list, built once and reused across resets."""
+    return level_cache(walls, "occupancy", lambda: OccupancyMap(walls))
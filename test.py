@@ -4,6 +4,9 @@ from util import *
 from game import ZombieShooter
 from agent import Agent
 from model import ZombieNet
+from inference import InferencePolicy, compare_policies
+from frame_stack import FrameStack
+import numpy as np
 import torch
 
 episodes = 1
@@ -22,6 +25,14 @@ gamma = 0.99
 hidden_layer = 1024
 dropout = 0.2
 
+# Must match frame_stack in train.py for the loaded weights
+frame_stack = 4
+
+# Evaluate with int8 fully connected layers; first reports how often its greedy
+# action matches fp32 on `quantize_check_states` states from a random rollout
+quantized = False
+quantize_check_states = 500
+
 WINDOW_WIDTH, WINDOW_HEIGHT = 1200, 800
 WORLD_WIDTH, WORLD_HEIGHT = 1800, 1200
 FPS = 60
@@ -35,12 +46,14 @@ observation, info = env.reset()
 
 agent = Agent(env, dropout=dropout, hidden_layer=hidden_layer,
               learning_rate=learning_rate, step_repeat=step_repeat,
-              gamma=gamma)
+              gamma=gamma, frame_stack=frame_stack)
 
 device = 'cuda:0' if torch.cuda.is_available() else 'cpu' 
 
-model1 = ZombieNet(action_dim=env.action_space.n, hidden_dim=hidden_layer, observation_shape=observation.shape).to(device)
-model2 = ZombieNet(action_dim=env.action_space.n, hidden_dim=hidden_layer, observation_shape=observation.shape).to(device)
+stack = FrameStack(frame_stack, observation.shape)
+
+model1 = ZombieNet(action_dim=env.action_space.n, hidden_dim=hidden_layer, observation_shape=stack.shape).to(device)
+model2 = ZombieNet(action_dim=env.action_space.n, hidden_dim=hidden_layer, observation_shape=stack.shape).to(device)
 
 model1.load_the_model(filename='models/best_model_2.pt')
 model2.load_the_model(filename='models/best_model_1.pt')
@@ -48,10 +61,34 @@ model2.load_the_model(filename='models/best_model_1.pt')
 model1.eval()
 model2.eval()
 
+# Greedy action over min(q1, q2) from one compiled CPU graph
+policy = InferencePolicy([model1, model2], stack.shape)
+
+if quantized:
+    quantized_policy = InferencePolicy([model1, model2], stack.shape, quantize=True)
+
+    check_states = []
+    stack.reset(observation)
+    while len(check_states) < quantize_check_states:
+        check_states.append(stack.stacks[0].copy())
+        observation, _, done, _, _ = env.step(action=env.action_space.sample(), repeat=step_repeat)
+        if done:
+            observation, _ = env.reset()
+            stack.reset(observation)
+        else:
+            stack.push(observation)
+
+    report = compare_policies(policy, quantized_policy, np.stack(check_states))
+    print(f"int8 greedy-action agreement: {report['agreement'] * 100:.1f}%")
+    print(f"Latency per action: fp32 {report['reference_ms']:.2f} ms | int8 {report['candidate_ms']:.2f} ms")
+
+    policy = quantized_policy
+
 for episode in range(episodes):
     done = False
     episode_reward = 0
     state, info = env.reset()
+    stacked_state = stack.reset(state)[0]
     episode_steps = 0
 
     episode_start_time = time.time()
@@ -60,16 +97,12 @@ for episode in range(episodes):
         if random.random() < epsilon:
             action = env.action_space.sample()
         else:
-            model1_q_values = model1.forward(state.unsqueeze(0).to(device))[0]
-            model2_q_values = model2.forward(state.unsqueeze(0).to(device))[0]
-
-            q_values = torch.min(model1_q_values, model2_q_values)
-
-            action = torch.argmax(q_values, dim=-1, keepdim=True)
+            action = int(policy(stacked_state)[0])
         
         next_state, reward, done, truncated, info = env.step(action=action, repeat=step_repeat)
 
         state = next_state
+        stacked_state = stack.push(next_state)[0]
 
         episode_reward += reward
         episode_steps += 1
@@ -1,6 +1,12 @@
+import argparse
 from util import *
 from game import ZombieShooter
-from agent import Agent
+import os
+from agent import Agent, make_result_dir
+from schedule import TrainSchedule
+from checkpoint import latest_checkpoint
+from vec_env import ZombieShooterVecEnv
+from apex import ApexActorPool
 
 episodes = 500
 max_episode_steps = 10000
@@ -22,16 +28,104 @@ WINDOW_WIDTH, WINDOW_HEIGHT = 1200, 800
 WORLD_WIDTH, WORLD_HEIGHT = 1800, 1200
 FPS = 60
 
-env = ZombieShooter(window_width=WINDOW_WIDTH, window_height=WINDOW_HEIGHT,
-                    world_height=WORLD_HEIGHT, world_width=WORLD_WIDTH,
-                    fps=FPS, sound=False, render_mode="rgb")
+# Number of envs stepped in parallel worker processes (1 = single in-process env)
+num_envs = 1
+
+# Ape-X mode: this many actor processes play with their own fixed epsilon while
+# this process only learns (0 = off). Weights go out every policy_sync_interval
+# updates; train_freq sets how many actor transitions each update consumes.
+num_actors = 0
+
+# Keep the replay buffer in memory-mapped files under the run's results folder,
+# so `--resume results/<run>` continues with its buffer as well as its checkpoint
+persistent_replay = True
+
+# Full training state (nets, optimizer, epsilon, RNG, counters) goes to
+# results/<run>/checkpoints every this many episodes; the newest few are kept
+checkpoint_interval = 10
+keep_checkpoints = 3
+
+# Sample transitions by TD error instead of uniformly
+prioritized_replay = False
+
+# Minibatches sampled ahead on a background thread (0 = sample inline)
+prefetch_batches = 4
+
+# Learner schedule: `gradient_steps` updates every `train_freq` env transitions
+# (summed over envs; num_envs keeps one update per vectorized step) once
+# `learning_starts` transitions are stored. Targets follow every
+# `target_update_interval` updates by Polyak averaging with `tau` (1 = hard copy);
+# the compiled acting policy takes new weights every `policy_sync_interval` updates.
+train_freq = num_envs
+gradient_steps = 1
+learning_starts = 0
+target_update_interval = 4
+tau = 0.005
+policy_sync_interval = 4
+
+# Act with int8 fully connected layers (CPU only). Each sync re-quantizes the
+# nets (~0.3 s), so the int8 policy takes new weights every
+# `quantized_sync_interval` updates instead of every `policy_sync_interval`
+quantized_policy = False
+quantized_sync_interval = 250
+
+# Metrics go to results/<run>/metrics.jsonl, losses averaged over this many
+# gradient steps. Set wandb_project to also export them to wandb; the key is
+# read from WANDB_API_KEY, and without it the wandb run stays offline
+metrics_interval = 100
+wandb_project = None
+
+# Per-episode phase timings (env_step and its env_step/... breakdown, replay, forward/backward, ...)
+# written to results/<run>/phase_timing.csv; off costs nothing
+profile = False
+
+# Number of most recent frames the networks see (test.py must use the same value)
+frame_stack = 4
+
+env_kwargs = dict(window_width=WINDOW_WIDTH, window_height=WINDOW_HEIGHT,
+                  world_height=WORLD_HEIGHT, world_width=WORLD_WIDTH,
+                  fps=FPS, sound=False, render_mode="rgb")
 
 summary_writer_suffix = f'dqn_lr={learning_rate}_hl={hidden_layer}_batch_size={batch_size}_dropout={dropout}'
 
-agent = Agent(env, dropout=dropout, hidden_layer=hidden_layer,
-              learning_rate=learning_rate, step_repeat=step_repeat,
-              gamma=gamma)
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Train the ZombieShooter DQN agent")
+    parser.add_argument("--resume", metavar="RESULT_DIR",
+                        help="continue the run in results/<run> from its latest checkpoint")
+    args = parser.parse_args()
+
+    result_dir = args.resume or make_result_dir(summary_writer_suffix)
+    checkpoint_path = latest_checkpoint(os.path.join(result_dir, "checkpoints")) if args.resume else None
+    if args.resume and checkpoint_path is None:
+        parser.error(f"no checkpoint found under {result_dir}/checkpoints")
+
+    if num_actors:
+        env = ApexActorPool(num_actors=num_actors, env_kwargs=env_kwargs, step_repeat=step_repeat)
+    elif num_envs > 1:
+        env = ZombieShooterVecEnv(num_envs=num_envs, env_kwargs=env_kwargs, step_repeat=step_repeat)
+    else:
+        env = ZombieShooter(**env_kwargs)
+
+    replay_dir = os.path.join(result_dir, "replay") if persistent_replay else None
+
+    agent = Agent(env, dropout=dropout, hidden_layer=hidden_layer,
+                  learning_rate=learning_rate, step_repeat=step_repeat,
+                  gamma=gamma, replay_dir=replay_dir,
+                  prioritized_replay=prioritized_replay, prefetch_batches=prefetch_batches,
+                  frame_stack=frame_stack,
+                  schedule=TrainSchedule(train_freq=train_freq, gradient_steps=gradient_steps,
+                                         learning_starts=learning_starts,
+                                         target_update_interval=target_update_interval, tau=tau,
+                                         policy_sync_interval=policy_sync_interval),
+                  quantized_policy=quantized_policy, quantized_sync_interval=quantized_sync_interval)
+
+    agent.train(episodes=episodes, max_episode_steps=max_episode_steps, summary_writer_suffix=summary_writer_suffix,
+                batch_size=batch_size, epsilon=epsilon, epsilon_decay=epsilon_decay, min_epsilon=min_epsilon,
+                result_dir=result_dir, checkpoint_interval=checkpoint_interval,
+                keep_checkpoints=keep_checkpoints, resume=checkpoint_path,
+                metrics_interval=metrics_interval, wandb_project=wandb_project, profile=profile)
 
-agent.train(episodes=episodes, max_episode_steps=max_episode_steps, summary_writer_suffix=summary_writer_suffix,
-            batch_size=batch_size, epsilon=epsilon, epsilon_decay=epsilon_decay, min_epsilon=min_epsilon)
+    if num_actors or num_envs > 1:
+        env.close()
 
@@ -14,4 +14,25 @@ def get_collision(rect, rect_list):
         
     return None
 
-        
\ No newline at end of file
+
+class SimClock:
+    """Simulation clock owned by the env.
+
+    Advances a fixed number of milliseconds per game frame, so every timed
+    mechanic (cooldowns, DOT ticks, effect animations) plays out the same
+    whether the env is stepped at 60 FPS or as fast as the CPU allows.
+    """
+
+    def __init__(self, fps):
+        self.frame_ms = 1000.0 / fps
+        self.frames = 0
+
+    def reset(self):
+        self.frames = 0
+
+    def tick(self):
+        self.frames += 1
+
+    def get_ticks(self):
+        # Same contract as pygame.time.get_ticks(): integer milliseconds
+        return int(self.frames * self.frame_ms)
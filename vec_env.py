@@ -0,0 +1,139 @@
+import ctypes
+import multiprocessing as mp
+import numpy as np
+import gymnasium as gym
+from game import OBSERVATION_SHAPE
+
+
+def _worker(index, remote, parent_remote, env_kwargs, step_repeat, shared_obs, num_envs):
+    """Owns one ZombieShooter and writes its frames straight into shared memory."""
+    parent_remote.close()
+
+    from game import ZombieShooter
+
+    env = ZombieShooter(**env_kwargs)
+    obs_buffer = np.frombuffer(shared_obs, dtype=np.uint8).reshape(num_envs, *OBSERVATION_SHAPE)
+
+    try:
+        while True:
+            command, data = remote.recv()
+
+            if command == "step":
+                action, truncate = data
+                observation, reward, done, truncated, info = env.step(action=action, repeat=step_repeat)
+                truncated = truncated or truncate
+
+                # Auto-reset: the terminal frame travels in info, the slot gets the new episode
+                if done or truncated:
+                    info["final_observation"] = observation
+                    observation, _ = env.reset()
+
+                obs_buffer[index] = observation
+                remote.send((reward, done, truncated, info))
+
+            elif command == "reset":
+                observation, info = env.reset()
+                obs_buffer[index] = observation
+                remote.send(info)
+
+            elif command == "close":
+                break
+
+            else:
+                raise ValueError(f"Unknown command {command}")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        remote.close()
+
+
+class ZombieShooterVecEnv():
+    """Runs `num_envs` ZombieShooter instances in worker processes.
+
+    Workers write their observation frames directly into one shared uint8
+    array, so only rewards, flags and info dicts travel through the pipes.
+    Finished episodes are reset automatically inside the worker; the frame
+    that ended the episode is returned in info["final_observation"].
+    """
+
+    def __init__(self, num_envs, env_kwargs, step_repeat=4, max_episode_steps=None, start_method=None):
+        self.num_envs = num_envs
+        self.step_repeat = step_repeat
+        self.max_episode_steps = max_episode_steps
+
+        self.action_space = gym.spaces.Discrete(7)
+        self.observation_space = gym.spaces.Box(low=0, high=255, shape=OBSERVATION_SHAPE, dtype=np.uint8)
+
+        # fork keeps train.py usable as a plain script; spawn is the only option on Windows
+        if start_method is None:
+            start_method = "fork" if "fork" in mp.get_all_start_methods() else "spawn"
+        ctx = mp.get_context(start_method)
+
+        self.shared_obs = ctx.RawArray(ctypes.c_uint8, num_envs * int(np.prod(OBSERVATION_SHAPE)))
+        self.obs_buffer = np.frombuffer(self.shared_obs, dtype=np.uint8).reshape(num_envs, *OBSERVATION_SHAPE)
+
+        self.remotes, self.processes = [], []
+        for index in range(num_envs):
+            remote, worker_remote = ctx.Pipe()
+            process = ctx.Process(target=_worker,
+                                  args=(index, worker_remote, remote, env_kwargs, step_repeat, self.shared_obs, num_envs),
+                                  daemon=True)
+            process.start()
+            worker_remote.close()
+            self.remotes.append(remote)
+            self.processes.append(process)
+
+        self.episode_steps = np.zeros(num_envs, dtype=np.int64)
+        self.closed = False
+
+    def reset(self):
+        for remote in self.remotes:
+            remote.send(("reset", None))
+        infos = [remote.recv() for remote in self.remotes]
+
+        self.episode_steps[:] = 0
+
+        return self.obs_buffer.copy(), infos
+
+    def step_async(self, actions):
+        for index, (remote, action) in enumerate(zip(self.remotes, actions)):
+            truncate = self.max_episode_steps is not None and self.episode_steps[index] + 1 >= self.max_episode_steps
+            remote.send(("step", (int(action), truncate)))
+
+    def step_wait(self):
+        results = [remote.recv() for remote in self.remotes]
+        rewards, dones, truncateds, infos = zip(*results)
+
+        rewards = np.array(rewards, dtype=np.float32)
+        dones = np.array(dones, dtype=bool)
+        truncateds = np.array(truncateds, dtype=bool)
+
+        self.episode_steps += 1
+        self.episode_steps[dones | truncateds] = 0
+
+        # Copy out of shared memory so callers can keep the previous batch around
+        return self.obs_buffer.copy(), rewards, dones, truncateds, list(infos)
+
+    def step(self, actions):
+        self.step_async(actions)
+        return self.step_wait()
+
+    def close(self):
+        if self.closed:
+            return
+
+        for remote in self.remotes:
+            try:
+                remote.send(("close", None))
+            except (BrokenPipeError, EOFError):
+                pass
+        for process in self.processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+
+        self.closed = True
+
+    def __del__(self):
+        if not getattr(self, "closed", True):
+            self.close()